@@ -0,0 +1,97 @@
+"""
+Chunker benchmark: legacy quadratic chunker vs utils.chunker
+Run from the app directory: python bench_chunker.py [--sentences 2000 4000 8000]
+"""
+import argparse
+import random
+import re
+import time
+
+from config import settings
+from utils import chunker
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+def legacy_chunk_text(text: str, tokenizer, max_tokens: int = 500) -> list[str]:
+    """The previous RAGService.chunk_text, kept here for comparison."""
+    sentences = re.split(r'[.!?]+', text)
+    chunks = []
+    current_chunk = ""
+
+    def token_len(s: str) -> int:
+        if tokenizer is not None:
+            return len(tokenizer.encode(s))
+        return max(1, len(s.split()))
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        test_chunk = current_chunk + " " + sentence if current_chunk else sentence
+        if token_len(test_chunk) > max_tokens:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+                current_chunk = sentence
+            else:
+                words = sentence.split()
+                step = max(1, max_tokens // 4)
+                for i in range(0, len(words), step):
+                    chunks.append(" ".join(words[i:i + step]))
+        else:
+            current_chunk = test_chunk
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+WORDS = ("hearing audiology clinic appointment patient insurance tinnitus device "
+         "battery warranty fitting exam follow-up results referral schedule").split()
+
+
+def make_text(sentences: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    out = []
+    for i in range(sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 30))]
+        if i % 50 == 0:
+            words.insert(0, "Dr. Smith, e.g. at St. Mary's,")
+        out.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+    return " ".join(out)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sentences", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=settings.CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    tokenizer = None
+    if tiktoken is not None:
+        try:
+            tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable ({e}); using word counts")
+
+    print(f"{'sentences':>10} {'chars':>10} {'legacy s':>10} {'new s':>10} {'speedup':>8} {'legacy #':>9} {'new #':>6} {'max tok':>8}")
+    for n in args.sentences:
+        text = make_text(n)
+        old, old_s = timed(legacy_chunk_text, text, tokenizer, args.max_tokens)
+        new, new_s = timed(chunker.chunk_text, text, args.max_tokens, args.overlap, tokenizer)
+        count = (lambda c: len(tokenizer.encode(c))) if tokenizer else (lambda c: len(c.split()))
+        largest = max((count(c) for c in new), default=0)
+        print(f"{n:>10} {len(text):>10} {old_s:>10.3f} {new_s:>10.3f} {old_s / max(new_s, 1e-9):>7.1f}x {len(old):>9} {len(new):>6} {largest:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+One-off compaction of duplicate visitors, open sessions and leads
+Run from the app directory before (or after a failed) upgrade to the unique
+indexes on users.external_user_id, open sessions and leads.client_id:
+
+    python compact_duplicates.py            # merge and commit
+    python compact_duplicates.py --dry-run  # report only
+
+- Users sharing an external_user_id are merged into the oldest one (lowest id):
+  sessions, leads and form responses are re-pointed to it, blank name / email /
+  IP fields are filled from the duplicates, and the duplicates are deleted.
+- Of several open sessions per user, the newest (the one chat was serving) stays
+  open; the others are closed, keeping their messages.
+- Of several leads per client id, the newest (the one /lead was returning) is
+  kept, blank name / email / user fields are filled from the older ones, and
+  those are deleted.
+"""
+import argparse
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from db import SessionLocal, engine
+from models import User, Session as ChatSession, Lead, FormResponse
+import schema_upgrades
+
+
+def merge_duplicate_users(db: Session) -> int:
+    duplicated = (
+        db.query(User.external_user_id)
+        .group_by(User.external_user_id)
+        .having(func.count(User.id) > 1)
+        .all()
+    )
+    merged = 0
+    for (client_id,) in duplicated:
+        users = db.query(User).filter(User.external_user_id == client_id).order_by(User.id).all()
+        keep, duplicates = users[0], users[1:]
+        duplicate_ids = [u.id for u in duplicates]
+        for model in (ChatSession, Lead, FormResponse):
+            db.execute(update(model).where(model.user_id.in_(duplicate_ids)).values(user_id=keep.id))
+        for dup in duplicates:
+            keep.name = keep.name or dup.name
+            keep.email = keep.email or dup.email
+            keep.ip_address = keep.ip_address or dup.ip_address
+            if dup.last_activity and (keep.last_activity is None or dup.last_activity > keep.last_activity):
+                keep.last_activity = dup.last_activity
+            db.delete(dup)
+        merged += len(duplicates)
+        print(f"  {client_id}: merged users {duplicate_ids} into {keep.id}")
+    db.flush()
+    return merged
+
+
+def close_duplicate_open_sessions(db: Session) -> int:
+    duplicated = (
+        db.query(ChatSession.user_id)
+        .filter(ChatSession.status == "open")
+        .group_by(ChatSession.user_id)
+        .having(func.count(ChatSession.id) > 1)
+        .all()
+    )
+    closed = 0
+    for (user_id,) in duplicated:
+        sessions = (
+            db.query(ChatSession)
+            .filter(ChatSession.user_id == user_id, ChatSession.status == "open")
+            .order_by(ChatSession.id.desc())
+            .all()
+        )
+        for sess in sessions[1:]:
+            sess.status = "closed"
+            sess.closed_at = func.now()
+            closed += 1
+        print(f"  user {user_id}: kept session {sessions[0].id} open, closed {[s.id for s in sessions[1:]]}")
+    db.flush()
+    return closed
+
+
+def merge_duplicate_leads(db: Session) -> int:
+    duplicated = (
+        db.query(Lead.client_id)
+        .group_by(Lead.client_id)
+        .having(func.count(Lead.id) > 1)
+        .all()
+    )
+    merged = 0
+    for (client_id,) in duplicated:
+        leads = db.query(Lead).filter(Lead.client_id == client_id).order_by(Lead.id.desc()).all()
+        keep, duplicates = leads[0], leads[1:]
+        for dup in duplicates:
+            keep.name = keep.name or dup.name
+            keep.email = keep.email or dup.email
+            keep.user_id = keep.user_id or dup.user_id
+            db.delete(dup)
+        merged += len(duplicates)
+        print(f"  {client_id}: merged leads {[lead.id for lead in duplicates]} into {keep.id}")
+    db.flush()
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate users, open sessions and leads")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change and roll back")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print("Merging duplicate users...")
+        merged = merge_duplicate_users(db)
+        print("Closing duplicate open sessions...")
+        closed = close_duplicate_open_sessions(db)
+        print("Merging duplicate leads...")
+        merged_leads = merge_duplicate_leads(db)
+        if args.dry_run:
+            db.rollback()
+            print(f"Dry run: would merge {merged} users, close {closed} sessions and merge {merged_leads} leads")
+            return
+        db.commit()
+        print(f"✅ Merged {merged} duplicate users, closed {closed} duplicate open sessions, merged {merged_leads} duplicate leads")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    schema_upgrades.apply_schema_upgrades(engine)
+    if schema_upgrades.visitor_constraints_ready:
+        print("✅ Unique indexes in place")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,12 +23,82 @@ class Settings(BaseSettings):
     
     # Chat history settings
     CHAT_HISTORY_MAX_TOKENS: int = 3000  # max tokens for conversation history (leaves room for system prompt + new message + response)
+    # Sessions whose token-budgeted history window is kept in memory per worker (LRU; 0 disables)
+    HISTORY_CACHE_MAX_SESSIONS: int = 5000
 
     # OpenAI generation settings
     OPENAI_MODEL: str = "gpt-3.5-turbo"
     OPENAI_TEMPERATURE: float = 0.3
     OPENAI_MAX_TOKENS: int = 400
 
+    # Shared OpenAI HTTP client (connection pool / keep-alive / timeouts)
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+
+    # Embedding backend for all-MiniLM-L6-v2: "sentence-transformers" (torch), "fastembed" (ONNX Runtime)
+    # or "auto" (fastembed if installed). Vectors are interchangeable, no re-indexing needed.
+    EMBEDDING_BACKEND: str = "auto"
+    # ONNX Runtime intra-op threads for fastembed (None = library default)
+    EMBEDDING_THREADS: Optional[int] = None
+    # Worker threads for background embedding work (warm-up, FAQ embedding sync, starter questions)
+    EMBEDDING_EXECUTOR_WORKERS: int = 2
+    # Worker threads for the per-turn query embedding / vector search stages (not shared with background work)
+    RETRIEVAL_EXECUTOR_WORKERS: int = 4
+    # Worker threads for in-memory FAQ index / BM25 scoring
+    LEXICAL_EXECUTOR_WORKERS: int = 2
+    # Chunks embedded / written to Chroma + document_chunks per batch during ingestion
+    EMBEDDING_BATCH_SIZE: int = 64
+    # Query embeddings kept in an LRU by normalized text (KB / semantic FAQ / response cache lookups)
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    # Tokens of trailing sentences repeated at the start of the next chunk (capped at half a chunk)
+    CHUNK_OVERLAP_TOKENS: int = 50
+    # Processes used to extract PDF pages in parallel during ingestion (0/1 = in-process)
+    PDF_EXTRACT_WORKERS: int = 0
+
+    # Background document ingestion (DB-backed job queue, local worker threads)
+    INGESTION_WORKERS: int = 1
+    INGESTION_POLL_SECONDS: float = 5.0
+    INGESTION_MAX_ATTEMPTS: int = 3
+    INGESTION_RETRY_DELAY_SECONDS: float = 30.0  # doubled after every failed attempt
+    INGESTION_LEASE_SECONDS: float = 900.0  # a "running" job older than this is assumed dead and re-claimed
+
+    # Response cache for repeated visitor questions (keyed on question + prompt/model + FAQ/KB versions)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    RESPONSE_CACHE_SEMANTIC_ENABLED: bool = True
+    RESPONSE_CACHE_MIN_SIMILARITY: float = 0.92  # cosine similarity for the semantic tier
+    RESPONSE_CACHE_MAX_HISTORY: int = 0  # only cache turns with at most this many prior messages
+
+    # Hybrid retrieval: BM25 + vector candidates per retriever, fused by reciprocal rank
+    RETRIEVAL_CANDIDATES: int = 10
+    RETRIEVAL_TOP_K: int = 3  # FAQ / document passages sent to the model as context
+    RETRIEVAL_MIN_SCORE: float = 0.3  # calibrated relevance (cosine similarity / IDF-weighted term coverage)
+    RETRIEVAL_STAGE_TIMEOUT_SECONDS: float = 3.0  # per stage, from when a worker starts it; a late stage is skipped
+    RETRIEVAL_QUEUE_TIMEOUT_SECONDS: float = 10.0  # max wait for a free worker; lexical scoring then runs inline
+
+    # Chat history (tokens) above which a turn is routed as "long_history"
+    MODEL_ROUTE_LONG_HISTORY_TOKENS: int = 1500
+
+    # Semantic FAQ matching (embedded FAQ questions, merged with lexical scores)
+    FAQ_SEMANTIC_ENABLED: bool = True
+    FAQ_SEMANTIC_MAX_DISTANCE: float = 0.35  # cosine distance; above this a paraphrase isn't trusted
+
+    # Direct FAQ answers (strict FAQ mode only): a confident match returns the stored answer without the LLM
+    FAQ_DIRECT_ANSWER_ENABLED: bool = True
+    FAQ_DIRECT_MAX_DISTANCE: float = 0.12  # cosine distance of a paraphrase that's answered directly
+    FAQ_DIRECT_MIN_COVERAGE: float = 0.6  # share of the FAQ question a contained (lexical) query must cover
+    FAQ_DIRECT_ANSWER_TEMPLATE: str = "{answer}"  # may use {answer} and {question}
+
+    # In-process config cache: max seconds before re-checking the shared version counter
+    CONFIG_CACHE_TTL_SECONDS: float = 10.0
+    # Browser cache lifetime for /widget-bootstrap (revalidated with ETag afterwards)
+    WIDGET_BOOTSTRAP_MAX_AGE_SECONDS: int = 60
+
     CORS_ORIGINS: List[str] = Field(default_factory=list)
     model_config = SettingsConfigDict( env_file=str(BASE_DIR / ".env"), case_sensitive=False)
     
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from config import settings
@@ -6,6 +8,21 @@ from config import settings
 engine=create_engine(settings.DB_URL,pool_pre_ping=True,future=True)
 SessionLocal=sessionmaker(autocommit=False,bind=engine,autoflush=False,future=True)
 
+def _async_db_url(url: str) -> str:
+    """Map the configured sync DB URL onto its asyncio driver (psycopg2 -> asyncpg)."""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend == "postgresql":
+        u = u.set(drivername="postgresql+asyncpg")
+    elif backend == "sqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    return u.render_as_string(hide_password=False)
+
+# Async engine for the chat hot path so DB round-trips don't block the event loop.
+# expire_on_commit=False: ORM attributes stay readable after commit without an implicit (sync) refresh.
+async_engine=create_async_engine(_async_db_url(settings.DB_URL),pool_pre_ping=True)
+AsyncSessionLocal=async_sessionmaker(bind=async_engine,autoflush=False,expire_on_commit=False)
+
 class Base(DeclarativeBase):
     pass
 
@@ -15,4 +32,7 @@ def get_db():
     yield db
  finally:
      db.close()
-     
\ No newline at end of file
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,39 +1,103 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Header, Response
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select, update, case, or_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
 from typing import List
-from openai import OpenAI
 from config import settings
-from db import get_db, Base, engine
-from models import Prompt, KnowledgeDocument, Message, User, Session as ChatSession, Lead, WidgetConfig, FAQ, DocumentVisibility, MessagingConfig, StarterQuestions, FormResponse, Form
-from schemas import ChatIn, ChatResponseOut, SystemPromptIn, SystemPromptOut, DocumentUploadOut, DocumentListOut, DocumentDeleteOut, ChatMessageOut, ChatDetailOut, UserOut, UserDetailOut, ChatOut
+from db import get_db, get_async_db, Base, engine, SessionLocal, AsyncSessionLocal
+from models import Prompt, KnowledgeDocument, IngestionJob, Message, User, Session as ChatSession, Lead, WidgetConfig, FAQ, DocumentVisibility, MessagingConfig, StarterQuestions, IntentTriggers, ModelRoute, FormResponse, Form
+from schemas import ChatIn, ChatResponseOut, SystemPromptIn, SystemPromptOut, DocumentUploadOut, DocumentListOut, DocumentDeleteOut, IngestionJobOut, ChatMessageOut, ChatDetailOut, UserOut, UserDetailOut, ChatOut
 from schemas import LeadIn, LeadOut, WidgetConfigOut, WidgetConfigIn
-from schemas import FormField, BotConfigOut, BotConfigIn, MessagingConfigOut, MessagingConfigIn, StarterQuestionsOut, StarterQuestionsIn
+from schemas import FormField, BotConfigOut, BotConfigIn, MessagingConfigOut, MessagingConfigIn, StarterQuestionsOut, StarterQuestionsIn, IntentTriggersOut, IntentTriggersIn, ModelRouteOut, ModelRouteIn, WidgetBootstrapOut
 from schemas import LoginIn, LoginOut
 from services.rag_service import RAGService
-from utils.token_counter import trim_history_to_token_budget
+from services.openai_client import init_openai_client, close_openai_client
+from services.ingestion_queue import IngestionQueue
+from services.intent_router import DEFAULT_TRIGGERS, triggers_from_row
+from services.model_router import TURN_CLASSES, load_routes
+from services.history_cache import HistoryWindowCache, HistoryTurn, fit_to_budget
+from services.config_cache import config_cache, version_registry, CONFIG_VERSION, FAQ_VERSION
+from utils.token_counter import count_tokens, count_messages_tokens, token_cache_stats
+import schema_upgrades
 import os
 import shutil
 from pathlib import Path
+import asyncio
 import csv
+import json
 from io import StringIO
 
 app = FastAPI()
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 rag_service = RAGService()
+history_cache = HistoryWindowCache(settings.HISTORY_CACHE_MAX_SESSIONS, settings.CHAT_HISTORY_MAX_TOKENS)
+ingestion_queue = IngestionQueue(rag_service, workers=settings.INGESTION_WORKERS, poll_seconds=settings.INGESTION_POLL_SECONDS)
 
 @app.on_event("startup")
 async def startup_event():
     """Create database tables on startup"""
     try:
         Base.metadata.create_all(bind=engine)
+        schema_upgrades.apply_schema_upgrades(engine)
         print("✅ Database tables created successfully")
     except Exception as e:
         print(f"❌ Error creating database tables: {e}")
         raise
+    # One pooled OpenAI client per process, reused by the RAG service
+    init_openai_client()
+    # Model / Chroma loading happens in the background so config and widget endpoints
+    # serve right away; /ready reports 503 until it's done
+    asyncio.get_running_loop().run_in_executor(rag_service.executor, _warm_up_rag)
+    # Search indexes are built up front (on the index thread, alongside the model load)
+    # rather than by the first chat after a restart
+    asyncio.get_running_loop().run_in_executor(rag_service.index_executor, rag_service.build_search_indexes)
+    # Document ingestion runs off the request path, fed by the ingestion_jobs table
+    ingestion_queue.start()
+
+def _warm_up_rag() -> None:
+    rag_service.warm_up()
+    # Backfill FAQ question embeddings (no-op once in sync)
+    _sync_faq_embeddings()
+    # Starter questions are the most repeated queries; embed them before the first visitor asks
+    _warm_starter_question_embeddings()
+
+def _sync_faq_embeddings() -> None:
+    db = SessionLocal()
+    try:
+        rag_service.sync_faq_embeddings(db)
+    except Exception as e:
+        print(f"⚠️ FAQ embedding sync failed: {e}")
+    finally:
+        db.close()
+
+def _warm_starter_question_embeddings() -> None:
+    db = SessionLocal()
+    try:
+        questions = _cached_starter_questions(db).questions
+    except Exception as e:
+        print(f"⚠️ Starter question embedding warm-up failed: {e}")
+        return
+    finally:
+        db.close()
+    _warm_query_embeddings(questions)
+
+def _warm_query_embeddings(questions: list[str]) -> None:
+    try:
+        warmed = rag_service.warm_query_embeddings(questions)
+        if warmed:
+            print(f"✅ Pre-warmed {warmed} starter question embeddings")
+    except Exception as e:
+        print(f"⚠️ Starter question embedding warm-up failed: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    ingestion_queue.stop()
+    await close_openai_client()
 
 # CORS: allow configured origins; if none provided, allow all (no credentials)
 origins = settings.cors_origins_parsed or ["*"]
@@ -117,13 +181,21 @@ async def list_form_entries(db: Session = Depends(get_db)):
     ]
     return JSONResponse(content={"entries": entries})
 
-def get_current_system_prompt(db: Session) -> str:
-    """Get the current system prompt from database or return default"""
+def _load_system_prompt(db: Session) -> str:
     prompt = db.query(Prompt).filter(Prompt.is_default == True).first()
     if prompt:
         return prompt.text
     return DEFAULT_SYSTEM_PROMPT
 
+def get_current_system_prompt(db: Session) -> str:
+    """Get the current system prompt (served from the versioned config cache)"""
+    return config_cache.get(db, "system_prompt", _load_system_prompt)
+
+def _invalidate_config(db: Session) -> None:
+    """Bump the shared config version in the current transaction.
+    Config caches in every worker reload once it is committed."""
+    version_registry.bump(db, CONFIG_VERSION)
+
 
 def require_admin(x_api_key: str | None = Header(default=None)):
     if settings.ADMIN_API_KEY and x_api_key == settings.ADMIN_API_KEY:
@@ -136,21 +208,66 @@ def require_admin(x_api_key: str | None = Header(default=None)):
 # ----- Per-client isolation helpers -----
 def _get_client_session(db: Session, client_id: str) -> ChatSession | None:
     """Get existing session for client, return None if no session exists."""
-    user = db.query(User).filter(User.external_user_id == client_id).first()
-    if not user:
-        return None
-    
-    sess = (
+    return (
         db.query(ChatSession)
-        .filter(ChatSession.user_id == user.id, ChatSession.status == "open")
+        .join(User, ChatSession.user_id == User.id)
+        .filter(User.external_user_id == client_id, ChatSession.status == "open")
         .order_by(ChatSession.id.desc())
         .first()
     )
-    return sess
+
+def _upsert_insert(db: Session):
+    """Dialect INSERT with ON CONFLICT support, or None when the visitor upserts can't be used
+    (unsupported backend, or unique indexes still blocked by duplicates)."""
+    if not schema_upgrades.visitor_constraints_ready:
+        return None
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert
+    if dialect == "sqlite":
+        return sqlite_insert
+    return None
+
+def _upsert_user(db: Session, insert, client_id: str, name: str | None = None, email: str | None = None, ip_address: str | None = None) -> int:
+    """Race-free get-or-create of the visitor's User (one INSERT ... ON CONFLICT); returns its id.
+    Existing users keep their name/email (blanks are filled in) and take the latest IP."""
+    stmt = insert(User).values(external_user_id=client_id, name=name or None, email=email or None, ip_address=ip_address)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.external_user_id],
+        set_={
+            "name": func.coalesce(func.nullif(User.name, ""), excluded.name, User.name),
+            "email": func.coalesce(func.nullif(User.email, ""), excluded.email, User.email),
+            "ip_address": func.coalesce(excluded.ip_address, User.ip_address),
+            "last_activity": case(
+                (or_(excluded.ip_address.is_not(None), excluded.name.is_not(None), excluded.email.is_not(None)), func.now()),
+                else_=User.last_activity,
+            ),
+        },
+    ).returning(User.id)
+    return db.execute(stmt).scalar_one()
 
 def _get_or_create_client_session(db: Session, client_id: str, name: str | None = None, email: str | None = None, ip_address: str | None = None) -> ChatSession:
     """Return a per-client session keyed by a stable client_id (from header or body).
-    Only creates session when there's actual user interaction (form submit or chat message)."""
+    Only creates session when there's actual user interaction (form submit or chat message).
+    Changes are flushed, not committed: the caller commits them with the rest of its work."""
+    insert = _upsert_insert(db)
+    if insert is not None:
+        # Concurrent widget requests can't create duplicates: both statements are
+        # backed by unique indexes (users.external_user_id, one open session per user)
+        user_id = _upsert_user(db, insert, client_id, name=name, email=email, ip_address=ip_address)
+        db.execute(
+            insert(ChatSession)
+            .values(user_id=user_id, status="open", session_metadata={"client_id": client_id})
+            .on_conflict_do_nothing(index_elements=[ChatSession.user_id], index_where=text("status = 'open'"))
+        )
+        return (
+            db.query(ChatSession)
+            .filter(ChatSession.user_id == user_id, ChatSession.status == "open")
+            .one()
+        )
+
+    # Fallback (duplicates not compacted yet): select-then-insert
     # Each unique client_id maps to one User and one open Session
     user = db.query(User).filter(User.external_user_id == client_id).first()
     if not user:
@@ -161,8 +278,7 @@ def _get_or_create_client_session(db: Session, client_id: str, name: str | None
             ip_address=ip_address
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        db.flush()
     else:
         # Update user info if provided
         updated = False
@@ -178,7 +294,6 @@ def _get_or_create_client_session(db: Session, client_id: str, name: str | None
         if updated:
             user.last_activity = func.now()
             db.add(user)
-            db.commit()
 
     sess = (
         db.query(ChatSession)
@@ -189,80 +304,124 @@ def _get_or_create_client_session(db: Session, client_id: str, name: str | None
     if not sess:
         sess = ChatSession(user_id=user.id, session_metadata={"client_id": client_id})
         db.add(sess)
-        db.commit()
-        db.refresh(sess)
+        db.flush()
     return sess
 
 def _get_or_create_user_by_client_id(db: Session, client_id: str) -> User:
+    """Flushes a new user if needed; the caller commits."""
+    insert = _upsert_insert(db)
+    if insert is not None:
+        return db.get(User, _upsert_user(db, insert, client_id))
     user = db.query(User).filter(User.external_user_id == client_id).first()
     if not user:
         user = User(external_user_id=client_id)
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        db.flush()
     return user
 
-def _fetch_history_by_token_budget(db: Session, session_id: int) -> list[dict]:
+def _upsert_lead(db: Session, user_id: int | None, client_id: str, name: str | None = None, email: str | None = None) -> int:
+    """Create or update the client's Lead and return its id; fields passed as None keep
+    their stored value (blank on insert). At least one of name / email must be given.
+    Race-free (one INSERT ... ON CONFLICT on leads.client_id) once the unique indexes exist.
+    Flushes, the caller commits."""
+    insert = _upsert_insert(db)
+    if insert is not None:
+        stmt = insert(Lead).values(user_id=user_id, client_id=client_id, name=name or "", email=email or "")
+        updates = {}
+        if name is not None:
+            updates["name"] = stmt.excluded.name
+        if email is not None:
+            updates["email"] = stmt.excluded.email
+        stmt = stmt.on_conflict_do_update(index_elements=[Lead.client_id], set_=updates).returning(Lead.id)
+        return db.execute(stmt).scalar_one()
+
+    # Fallback (duplicates not compacted yet): select-then-insert
+    existing = (
+        db.query(Lead)
+        .filter(Lead.client_id == client_id)
+        .order_by(Lead.id.desc())
+        .first()
+    )
+    if existing:
+        if name is not None:
+            existing.name = name
+        if email is not None:
+            existing.email = email
+        db.add(existing)
+        db.flush()
+        return existing.id
+    lead = Lead(user_id=user_id, client_id=client_id, name=name or "", email=email or "")
+    db.add(lead)
+    db.flush()
+    return lead.id
+
+def _fetch_history_by_token_budget(db: Session, session_id: int) -> list[HistoryTurn]:
     """Fetch chat history strictly by token budget (no arbitrary message limit).
-    We page messages in chunks from newest to oldest until the budget is filled.
+    One query: a running sum of stored token counts, newest first, keeps exactly the
+    messages that fit CHAT_HISTORY_MAX_TOKENS (same rule as trim_history_to_token_budget:
+    content tokens + 4 per message, stop at the first that doesn't fit).
+    Legacy rows without token_count are estimated at ~4 chars/token.
     """
-    # Hard guard against runaway DB scans; can be tuned
-    page_size = 100
-    offset = 0
-    collected: list[Message] = []
-
-    # Keep pulling pages until adding another page would exceed token budget after trimming
-    while True:
-        page = (
-            db.query(Message)
-            .filter(Message.session_id == session_id)
-            .order_by(Message.id.desc())
-            .offset(offset)
-            .limit(page_size)
-            .all()
+    budget = settings.CHAT_HISTORY_MAX_TOKENS
+    if budget <= 0:
+        return []
+    message_tokens = func.coalesce(Message.token_count, func.length(Message.content) / 4) + 4
+    recent = (
+        select(
+            Message.id,
+            Message.role,
+            Message.content,
+            message_tokens.label("tokens"),
+            func.sum(message_tokens).over(order_by=Message.id.desc(), rows=(None, 0)).label("running_tokens"),
         )
-        if not page:
-            break
-
-        collected.extend(page)
-        # Try trimming with what we have so far; if it already meets budget, we can stop
-        test_msgs = [
-            {"role": m.role, "content": m.content}
-            for m in reversed(collected)
-            if m.role in ("user", "assistant")
-        ]
-        trimmed = trim_history_to_token_budget(
-            test_msgs,
-            settings.CHAT_HISTORY_MAX_TOKENS,
-            settings.OPENAI_MODEL,
-        )
-        # If trimming didn't grow with this page (i.e., budget reached), stop
-        if len(trimmed) < len(test_msgs):
-            break
-        offset += page_size
-
-    # Final trim on the aggregated set
-    final_msgs = [
-        {"role": m.role, "content": m.content}
-        for m in reversed(collected)
-        if m.role in ("user", "assistant")
-    ]
-    return trim_history_to_token_budget(
-        final_msgs, settings.CHAT_HISTORY_MAX_TOKENS, settings.OPENAI_MODEL
+        .where(Message.session_id == session_id, Message.role.in_(("user", "assistant")))
+        .order_by(Message.id.desc())
+        # Every message costs at least 4 tokens, so no more than this many can fit
+        .limit(budget // 4 + 1)
+        .subquery()
     )
+    rows = db.execute(
+        select(recent.c.id, recent.c.role, recent.c.content, recent.c.tokens)
+        .where(recent.c.running_tokens <= budget)
+        .order_by(recent.c.id)
+    ).all()
+    return [HistoryTurn(*row) for row in rows]
+
+def _touch_session(db: Session, session_id: int) -> int | None:
+    """Bump the session's last_message_at and message_version alongside a message insert
+    (same transaction); returns the new version, or None if the session is gone."""
+    return db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(last_message_at=func.now(), message_version=ChatSession.message_version + 1)
+        .returning(ChatSession.message_version)
+    ).scalar_one_or_none()
+
+def _history_messages(db: Session, session_id: int, message_version: int, reserved_tokens: int = 0) -> list[dict]:
+    """Token-budgeted history (oldest first) from the per-session window cache,
+    loading it with _fetch_history_by_token_budget on a miss.
+    message_version comes from the already loaded session row, so a cache hit costs no query.
+    reserved_tokens is taken off the budget (e.g. for the system prompt).
+    """
+    turns = history_cache.get(session_id, message_version)
+    if turns is None:
+        turns = _fetch_history_by_token_budget(db, session_id)
+        history_cache.put(session_id, message_version, turns)
+    window = fit_to_budget(turns, settings.CHAT_HISTORY_MAX_TOKENS - reserved_tokens)
+    return [{"role": turn.role, "content": turn.content} for turn in window]
 
 
 @app.get("/messages")
-async def get_messages(x_client_id: str | None = Header(default=None), db: Session = Depends(get_db)):
+async def get_messages(x_client_id: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
     """Return recent messages for the caller's isolated session, limited by token budget.
     Uses X-Client-Id header as the isolation key. Only returns messages if session exists.
     """
     try:
         client_id = x_client_id or "anonymous"
-        sess = _get_client_session(db, client_id)
+        sess = await db.run_sync(_get_client_session, client_id)
         if not sess:
             return {"messages": []}
-        trimmed = _fetch_history_by_token_budget(db, sess.id)
+        trimmed = await db.run_sync(_history_messages, sess.id, sess.message_version)
         # Return trimmed messages in chronological order
         return {"messages": trimmed}
     except Exception as e:
@@ -270,119 +429,197 @@ async def get_messages(x_client_id: str | None = Header(default=None), db: Sessi
 
 # Removed multi-session management endpoints in single-session mode
 
+def _client_ip(x_forwarded_for: str | None, x_real_ip: str | None) -> str | None:
+    """Extract the visitor IP address from proxy headers."""
+    if x_real_ip:
+        return x_real_ip
+    if x_forwarded_for:
+        # X-Forwarded-For can contain multiple IPs, take the first one
+        return x_forwarded_for.split(',')[0].strip()
+    return None
+
+def _prepare_chat_turn(db: Session, chat_data: ChatIn, client_id: str, ip_address: str | None) -> tuple[ChatSession, str, list[dict], dict]:
+    """Shared setup for /chat and /chat/stream.
+    Resolves the caller's session, loads token-budgeted history, upserts the lead
+    and persists the incoming user message, all in a single commit.
+    Returns (session, system_prompt, history, messaging_config).
+    """
+    system_prompt = get_current_system_prompt(db)
+
+    # Build OpenAI-formatted history for the caller's isolated session
+    sess = _get_or_create_client_session(
+        db, 
+        client_id, 
+        name=chat_data.name, 
+        email=chat_data.email, 
+        ip_address=ip_address
+    )
+    # History budget leaves room for the system prompt (the RAG service adds it back)
+    system_tokens = count_messages_tokens([{"role": "system", "content": system_prompt}], settings.OPENAI_MODEL)
+    history = _history_messages(db, sess.id, sess.message_version, reserved_tokens=system_tokens)
+
+    # If name/email provided in this request, upsert lead (in a savepoint so a
+    # failure only drops the lead, not the rest of the turn)
+    if (chat_data.name and chat_data.name.strip()) or chat_data.email:
+        try:
+            with db.begin_nested():
+                _upsert_lead(
+                    db,
+                    sess.user_id,
+                    client_id,
+                    name=chat_data.name.strip() if chat_data.name and chat_data.name.strip() else None,
+                    email=str(chat_data.email) if chat_data.email else None,
+                )
+        except Exception:
+            # don't fail the chat on lead save error
+            pass
+
+    # Persist the current user message
+    user_tokens = count_tokens(chat_data.message, settings.OPENAI_MODEL)
+    user_msg = Message(session_id=sess.id, role="user", content=chat_data.message, token_count=user_tokens)
+    db.add(user_msg)
+    
+    # Set session title from first user message if not already set
+    if not sess.title:
+        sess.title = chat_data.message[:50] + "..." if len(chat_data.message) > 50 else chat_data.message
+    
+    db.add(sess)
+    db.flush()
+    user_msg_id = user_msg.id
+    # Update session's last_message_at timestamp and history version
+    message_version = _touch_session(db, sess.id)
+    db.commit()
+    history_cache.append(sess.id, message_version, HistoryTurn(user_msg_id, "user", chat_data.message, user_tokens + 4))
+
+    # Get messaging configuration
+    messaging_cfg = _cached_messaging_config(db)
+    messaging_config = {
+        'ai_model': messaging_cfg.ai_model,
+        'conversational': messaging_cfg.conversational,
+        'strict_faq': messaging_cfg.strict_faq,
+        'response_length': messaging_cfg.response_length,
+        'welcome_message': messaging_cfg.welcome_message,
+        'server_error_message': messaging_cfg.server_error_message
+    }
+    return sess, system_prompt, history, messaging_config
+
+def _persist_assistant_reply(db: Session, session_id: int, reply: str) -> None:
+    """Store the assistant reply and bump the session's last_message_at."""
+    reply_tokens = count_tokens(reply, settings.OPENAI_MODEL)
+    assistant_msg = Message(session_id=session_id, role="assistant", content=reply, token_count=reply_tokens)
+    db.add(assistant_msg)
+    db.flush()
+    assistant_msg_id = assistant_msg.id
+    
+    # Update session's last_message_at timestamp and history version again for assistant message
+    message_version = _touch_session(db, session_id)
+    db.commit()
+    if message_version is not None:
+        history_cache.append(session_id, message_version, HistoryTurn(assistant_msg_id, "assistant", reply, reply_tokens + 4))
+
+# Streamed-reply saves run as tasks so a client disconnect can't cancel them; keep references until done
+_reply_saves: set[asyncio.Task] = set()
+
+def _save_streamed_reply(session_id: int, reply: str) -> asyncio.Task:
+    async def save() -> None:
+        # The request-scoped session may already be closed once the body is streaming
+        async with AsyncSessionLocal() as stream_db:
+            try:
+                await stream_db.run_sync(_persist_assistant_reply, session_id, reply)
+            except Exception as e:
+                await stream_db.rollback()
+                print(f"⚠️ Failed to save streamed reply for session {session_id}: {e}")
+    task = asyncio.ensure_future(save())
+    _reply_saves.add(task)
+    task.add_done_callback(_reply_saves.discard)
+    return task
+
 @app.post("/chat", response_model=ChatResponseOut)
-async def chat(chat_data: ChatIn, x_client_id: str | None = Header(default=None), x_forwarded_for: str | None = Header(default=None), x_real_ip: str | None = Header(default=None), db: Session = Depends(get_db)):
+async def chat(chat_data: ChatIn, x_client_id: str | None = Header(default=None), x_forwarded_for: str | None = Header(default=None), x_real_ip: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
     """Chat endpoint with token-budgeted message history.
     - Loads recent messages for the session within token limits
     - Persists the new user message and the assistant reply
     - Passes history to the RAG service for context
+    DB work runs through the async session (run_sync keeps the shared helpers single-sourced),
+    generation uses AsyncOpenAI, so a slow completion never blocks other visitors.
     """
     try:
-        system_prompt = get_current_system_prompt(db)
-
-        # Extract IP address from headers
-        ip_address = None
-        if x_real_ip:
-            ip_address = x_real_ip
-        elif x_forwarded_for:
-            # X-Forwarded-For can contain multiple IPs, take the first one
-            ip_address = x_forwarded_for.split(',')[0].strip()
-
-        # Build OpenAI-formatted history for the caller's isolated session
+        ip_address = _client_ip(x_forwarded_for, x_real_ip)
         client_id = (chat_data.client_id or x_client_id or "anonymous").strip() or "anonymous"
-        sess = _get_or_create_client_session(
-            db, 
-            client_id, 
-            name=chat_data.name, 
-            email=chat_data.email, 
-            ip_address=ip_address
-        )
-        raw_history = _fetch_history_by_token_budget(db, sess.id)
-
-        # Add system prompt and trim to token budget
-        messages_with_system = [{"role": "system", "content": system_prompt}] + raw_history
-        history = trim_history_to_token_budget(
-            messages_with_system,
-            settings.CHAT_HISTORY_MAX_TOKENS,
-            settings.OPENAI_MODEL,
-        )
-
-        # Remove system prompt from history (RAG service will add it back)
-        history = [msg for msg in history if msg.get("role") != "system"]
-
-        # If name/email provided in this request, upsert lead
-        if (chat_data.name and chat_data.name.strip()) or chat_data.email:
-            try:
-                # Ensure user exists
-                _user = _get_or_create_user_by_client_id(db, client_id)
-                existing = (
-                    db.query(Lead)
-                    .filter(Lead.client_id == client_id)
-                    .order_by(Lead.id.desc())
-                    .first()
-                )
-                if existing:
-                    if chat_data.name and chat_data.name.strip():
-                        existing.name = chat_data.name.strip()
-                    if chat_data.email:
-                        existing.email = str(chat_data.email)
-                    db.add(existing)
-                    db.commit()
-                else:
-                    lead = Lead(user_id=_user.id, client_id=client_id, name=(chat_data.name or "").strip(), email=str(chat_data.email) if chat_data.email else "")
-                    db.add(lead)
-                    db.commit()
-            except Exception:
-                db.rollback()
-                # don't fail the chat on lead save error
-                pass
-
-        # Persist the current user message
-        user_msg = Message(session_id=sess.id, role="user", content=chat_data.message)
-        db.add(user_msg)
-        
-        # Update session's last_message_at timestamp
-        sess.last_message_at = func.now()
-        
-        # Set session title from first user message if not already set
-        if not sess.title:
-            sess.title = chat_data.message[:50] + "..." if len(chat_data.message) > 50 else chat_data.message
-        
-        db.add(sess)
-        db.commit()
-        db.refresh(user_msg)
-
-        # Get messaging configuration
-        messaging_cfg = _get_or_create_messaging_config(db)
-        messaging_config = {
-            'ai_model': messaging_cfg.ai_model,
-            'conversational': messaging_cfg.conversational,
-            'strict_faq': messaging_cfg.strict_faq,
-            'response_length': messaging_cfg.response_length,
-            'welcome_message': messaging_cfg.welcome_message,
-            'server_error_message': messaging_cfg.server_error_message
-        }
+        sess, system_prompt, history, messaging_config = await db.run_sync(_prepare_chat_turn, chat_data, client_id, ip_address)
 
         # Generate response with token-budgeted history and messaging config
-        reply, used_kb = rag_service.generate_rag_response(
+        reply, used_kb = await rag_service.generate_rag_response(
             chat_data.message, system_prompt, db, history=history, messaging_config=messaging_config
         )
 
         # Persist assistant reply
-        assistant_msg = Message(session_id=sess.id, role="assistant", content=reply)
-        db.add(assistant_msg)
-        
-        # Update session's last_message_at timestamp again for assistant message
-        sess.last_message_at = func.now()
-        db.add(sess)
-        db.commit()
+        await db.run_sync(_persist_assistant_reply, sess.id, reply)
 
         return ChatResponseOut(reply=reply, used_faq=used_kb, run_id="rag-response")
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ChatResponseOut(reply=f"Error: {str(e)}", used_faq=False, run_id=None)
 
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(chat_data: ChatIn, x_client_id: str | None = Header(default=None), x_forwarded_for: str | None = Header(default=None), x_real_ip: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
+    """Streaming chat endpoint (Server-Sent Events).
+    Emits `meta` once retrieval is done, a `delta` event per generated token chunk,
+    then `done` with the full reply after the assistant message is persisted.
+    Failures are reported as an `error` event so the widget can fall back gracefully.
+    """
+    try:
+        ip_address = _client_ip(x_forwarded_for, x_real_ip)
+        client_id = (chat_data.client_id or x_client_id or "anonymous").strip() or "anonymous"
+        sess, system_prompt, history, messaging_config = await db.run_sync(_prepare_chat_turn, chat_data, client_id, ip_address)
+        deltas, used_kb = await rag_service.stream_rag_response(
+            chat_data.message, system_prompt, db, history=history, messaging_config=messaging_config
+        )
+        session_id = sess.id
+    except Exception as e:
+        await db.rollback()
+        error_event = _sse("error", {"reply": f"Error: {str(e)}", "used_faq": False, "run_id": None})
+        return StreamingResponse(iter([error_event]), media_type="text/event-stream")
+
+    async def event_stream():
+        parts: list[str] = []
+        saved = None
+        try:
+            yield _sse("meta", {"used_faq": used_kb})
+            try:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield _sse("delta", {"delta": delta})
+            except Exception as e:
+                yield _sse("error", {"reply": f"Error: {str(e)}", "used_faq": False, "run_id": None})
+                return
+            reply = "".join(parts)
+            if reply.strip():
+                saved = _save_streamed_reply(session_id, reply)
+                # Shielded: a disconnect right now must not cancel the save halfway
+                await asyncio.shield(saved)
+            else:
+                # Nothing generated: an empty assistant turn would only pollute later history
+                print(f"⚠️ Empty streamed reply for session {session_id}, not saved")
+            yield _sse("done", {"reply": reply, "used_faq": used_kb, "run_id": "rag-response"})
+        finally:
+            # Client disconnected (or generation failed) mid-stream: keep what was already sent.
+            # Scheduled rather than awaited, since awaiting in a cancelled stream isn't reliable.
+            partial = "".join(parts)
+            if saved is None and partial.strip():
+                _save_streamed_reply(session_id, partial)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/system-prompt", response_model=SystemPromptOut)
 async def get_system_prompt(db: Session = Depends(get_db)):
     """Get the current system prompt"""
@@ -417,24 +654,9 @@ async def save_lead(lead_in: LeadIn, x_client_id: str | None = Header(default=No
         user = _get_or_create_user_by_client_id(db, client_id)
 
         # Upsert behavior: if a lead exists for client, update; else create new
-        existing = (
-            db.query(Lead)
-            .filter(Lead.client_id == client_id)
-            .order_by(Lead.id.desc())
-            .first()
-        )
-        if existing:
-            existing.name = lead_in.name
-            existing.email = str(lead_in.email)
-            db.add(existing)
-            db.commit()
-            db.refresh(existing)
-            lead = existing
-        else:
-            lead = Lead(user_id=user.id, client_id=client_id, name=lead_in.name, email=str(lead_in.email))
-            db.add(lead)
-            db.commit()
-            db.refresh(lead)
+        lead_id = _upsert_lead(db, user.id, client_id, name=lead_in.name, email=str(lead_in.email))
+        db.commit()
+        lead = db.get(Lead, lead_id)
 
         return LeadOut(id=lead.id, name=lead.name, email=lead.email, created_at=lead.created_at.isoformat())
     except Exception as e:
@@ -474,9 +696,7 @@ def _get_or_create_widget_config(db: Session) -> WidgetConfig:
         db.refresh(cfg)
     return cfg
 
-@app.get("/widget-config", response_model=WidgetConfigOut)
-async def get_widget_config(db: Session = Depends(get_db)):
-    cfg = _get_or_create_widget_config(db)
+def _widget_config_out(cfg: WidgetConfig) -> WidgetConfigOut:
     fields_raw = cfg.form_fields or []
     # Back-compat: allow storing theme color inside a special meta object in form_fields
     primary = cfg.primary_color
@@ -513,6 +733,13 @@ async def get_widget_config(db: Session = Depends(get_db)):
         starter_questions=cfg.starter_questions
     )
 
+def _cached_widget_config(db: Session) -> WidgetConfigOut:
+    return config_cache.get(db, "widget_config", lambda d: _widget_config_out(_get_or_create_widget_config(d)))
+
+@app.get("/widget-config", response_model=WidgetConfigOut)
+async def get_widget_config(db: Session = Depends(get_db)):
+    return _cached_widget_config(db)
+
 @app.post("/widget-config", response_model=WidgetConfigOut)
 async def update_widget_config(data: WidgetConfigIn, db: Session = Depends(get_db), _: bool = Depends(require_admin)):
     cfg = _get_or_create_widget_config(db)
@@ -555,6 +782,7 @@ async def update_widget_config(data: WidgetConfigIn, db: Session = Depends(get_d
         cfg.form_fields = sorted_fields
     db.add(cfg)
     try:
+        _invalidate_config(db)
         db.commit()
     except Exception:
         # Column may not exist in existing DBs; fallback to storing in meta inside form_fields
@@ -566,6 +794,7 @@ async def update_widget_config(data: WidgetConfigIn, db: Session = Depends(get_d
             fields.append({'name':'__config','type':'meta','style':{'primary_color': data.primary_color, 'avatar_url': data.avatar_url}})
             cfg.form_fields = fields
             db.add(cfg)
+            _invalidate_config(db)
             db.commit()
         except Exception:
             db.rollback()
@@ -603,6 +832,7 @@ async def update_bot_config(data: BotConfigIn, db: Session = Depends(get_db), _:
     cfg = _get_or_create_widget_config(db)
     cfg.bot_name = data.bot_name.strip() or "ChatBot"
     db.add(cfg)
+    _invalidate_config(db)
     db.commit()
     db.refresh(cfg)
     return BotConfigOut(bot_name=cfg.bot_name)
@@ -646,11 +876,7 @@ def _get_or_create_starter_questions(db: Session) -> StarterQuestions:
         db.refresh(cfg)
     return cfg
 
-# Messaging configuration endpoints
-@app.get("/messaging-config", response_model=MessagingConfigOut)
-async def get_messaging_config(db: Session = Depends(get_db)):
-    """Get messaging configuration"""
-    cfg = _get_or_create_messaging_config(db)
+def _messaging_config_out(cfg: MessagingConfig) -> MessagingConfigOut:
     return MessagingConfigOut(
         ai_model=cfg.ai_model,
         conversational=cfg.conversational,
@@ -667,6 +893,24 @@ async def get_messaging_config(db: Session = Depends(get_db)):
         server_error_message=cfg.server_error_message
     )
 
+def _cached_messaging_config(db: Session) -> MessagingConfigOut:
+    return config_cache.get(db, "messaging_config", lambda d: _messaging_config_out(_get_or_create_messaging_config(d)))
+
+def _starter_questions_out(cfg: StarterQuestions) -> StarterQuestionsOut:
+    return StarterQuestionsOut(
+        questions=cfg.questions or [],
+        enabled=cfg.enabled
+    )
+
+def _cached_starter_questions(db: Session) -> StarterQuestionsOut:
+    return config_cache.get(db, "starter_questions", lambda d: _starter_questions_out(_get_or_create_starter_questions(d)))
+
+# Messaging configuration endpoints
+@app.get("/messaging-config", response_model=MessagingConfigOut)
+async def get_messaging_config(db: Session = Depends(get_db)):
+    """Get messaging configuration"""
+    return _cached_messaging_config(db)
+
 @app.put("/messaging-config", response_model=MessagingConfigOut)
 async def update_messaging_config(data: MessagingConfigIn, db: Session = Depends(get_db), _: bool = Depends(require_admin)):
     """Update messaging configuration"""
@@ -701,34 +945,17 @@ async def update_messaging_config(data: MessagingConfigIn, db: Session = Depends
         cfg.server_error_message = data.server_error_message.strip() or "Apologies, there seems to be a server error."
     
     db.add(cfg)
+    _invalidate_config(db)
     db.commit()
     db.refresh(cfg)
     
-    return MessagingConfigOut(
-        ai_model=cfg.ai_model,
-        conversational=cfg.conversational,
-        strict_faq=cfg.strict_faq,
-        response_length=cfg.response_length,
-        suggest_followups=cfg.suggest_followups,
-        allow_images=cfg.allow_images,
-        show_sources=cfg.show_sources,
-        post_feedback=cfg.post_feedback,
-        multilingual=cfg.multilingual,
-        show_welcome=cfg.show_welcome,
-        welcome_message=cfg.welcome_message,
-        no_source_message=cfg.no_source_message,
-        server_error_message=cfg.server_error_message
-    )
+    return _messaging_config_out(cfg)
 
 # Starter questions configuration endpoints
 @app.get("/starter-questions", response_model=StarterQuestionsOut)
 async def get_starter_questions(db: Session = Depends(get_db)):
     """Get starter questions configuration"""
-    cfg = _get_or_create_starter_questions(db)
-    return StarterQuestionsOut(
-        questions=cfg.questions or [],
-        enabled=cfg.enabled
-    )
+    return _cached_starter_questions(db)
 
 @app.put("/starter-questions", response_model=StarterQuestionsOut)
 async def update_starter_questions(data: StarterQuestionsIn, db: Session = Depends(get_db), _: bool = Depends(require_admin)):
@@ -743,13 +970,103 @@ async def update_starter_questions(data: StarterQuestionsIn, db: Session = Depen
         cfg.enabled = data.enabled
     
     db.add(cfg)
+    _invalidate_config(db)
     db.commit()
     db.refresh(cfg)
+    # Background warm-up; _warm_query_embeddings logs its own failures
+    asyncio.get_running_loop().run_in_executor(rag_service.executor, _warm_query_embeddings, list(cfg.questions or []))
     
-    return StarterQuestionsOut(
-        questions=cfg.questions or [],
-        enabled=cfg.enabled
+    return _starter_questions_out(cfg)
+
+# Intent router trigger configuration endpoints
+@app.get("/intent-triggers", response_model=IntentTriggersOut)
+async def get_intent_triggers(db: Session = Depends(get_db), _: bool = Depends(require_admin)):
+    """Get the trigger phrases the chat intent router uses (defaults until saved)"""
+    return IntentTriggersOut(**triggers_from_row(db.query(IntentTriggers).first()))
+
+@app.put("/intent-triggers", response_model=IntentTriggersOut)
+async def update_intent_triggers(data: IntentTriggersIn, db: Session = Depends(get_db), _: bool = Depends(require_admin)):
+    """Update intent router triggers; every worker recompiles its router on the next chat turn"""
+    cfg = db.query(IntentTriggers).first()
+    if not cfg:
+        cfg = IntentTriggers(**DEFAULT_TRIGGERS)
+    
+    for field, value in data.model_dump(exclude_none=True).items():
+        if isinstance(value, list):
+            value = [t.strip() for t in value if t and t.strip()]
+        setattr(cfg, field, value)
+    
+    db.add(cfg)
+    _invalidate_config(db)
+    db.commit()
+    db.refresh(cfg)
+    
+    return IntentTriggersOut(**triggers_from_row(cfg))
+
+# Model routing policy endpoints
+def _model_routes_out(db: Session) -> List[ModelRouteOut]:
+    routes = load_routes(db)
+    hits = rag_service.model_router.stats()
+    return [
+        ModelRouteOut(turn_class=turn_class, model=routes[turn_class].model, max_tokens=routes[turn_class].max_tokens, hits=hits[turn_class])
+        for turn_class in TURN_CLASSES
+    ]
+
+@app.get("/model-routes", response_model=List[ModelRouteOut])
+async def get_model_routes(db: Session = Depends(get_db), _: bool = Depends(require_admin)):
+    """Model / max_tokens per turn class, with this worker's hit counts"""
+    return _model_routes_out(db)
+
+@app.put("/model-routes", response_model=List[ModelRouteOut])
+async def update_model_routes(data: List[ModelRouteIn], db: Session = Depends(get_db), _: bool = Depends(require_admin)):
+    """Override routes; a null model means the configured ai_model"""
+    for item in data:
+        if item.turn_class not in TURN_CLASSES:
+            raise HTTPException(status_code=400, detail=f"Unknown turn class '{item.turn_class}' (expected one of {', '.join(TURN_CLASSES)})")
+        if item.max_tokens is not None and item.max_tokens <= 0:
+            raise HTTPException(status_code=400, detail="max_tokens must be positive")
+    
+    current = load_routes(db)
+    for item in data:
+        route = db.get(ModelRoute, item.turn_class) or ModelRoute(turn_class=item.turn_class)
+        route.model = (item.model or "").strip() or None
+        route.max_tokens = item.max_tokens or current[item.turn_class].max_tokens
+        db.add(route)
+    
+    _invalidate_config(db)
+    db.commit()
+    
+    return _model_routes_out(db)
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or any(t.removeprefix("W/") == etag for t in candidates)
+
+@app.get("/widget-bootstrap", response_model=WidgetBootstrapOut)
+async def get_widget_bootstrap(if_none_match: str | None = Header(default=None), db: Session = Depends(get_db)):
+    """Everything the widget needs on startup (widget config, messaging config, starter questions)
+    in one response. The ETag is the shared config version, so repeat visits revalidate with a 304
+    served from the in-process config cache.
+    """
+    etag = f'"cfg-{config_cache.version(db)}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.WIDGET_BOOTSTRAP_MAX_AGE_SECONDS}, must-revalidate",
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    payload = WidgetBootstrapOut(
+        widget_config=_cached_widget_config(db),
+        messaging_config=_cached_messaging_config(db),
+        starter_questions=_cached_starter_questions(db),
     )
+    return JSONResponse(content=payload.model_dump(), headers=headers)
+
+@app.get("/api/widget-bootstrap", response_model=WidgetBootstrapOut)
+async def get_widget_bootstrap_api(if_none_match: str | None = Header(default=None), db: Session = Depends(get_db)):
+    return await get_widget_bootstrap(if_none_match=if_none_match, db=db)
 
 # Avatar upload endpoint (stores under /static/avatars and returns the public URL)
 AVATAR_DIR = Path("static/avatars")
@@ -771,7 +1088,7 @@ async def upload_avatar(file: UploadFile = File(...), db: Session = Depends(get_
         # Optionally set as current avatar
         cfg = _get_or_create_widget_config(db)
         cfg.avatar_url = url
-        db.add(cfg); db.commit(); db.refresh(cfg)
+        db.add(cfg); _invalidate_config(db); db.commit(); db.refresh(cfg)
         return {"url": url}
     except HTTPException:
         raise
@@ -868,21 +1185,7 @@ async def submit_dynamic_form(payload: dict, x_client_id: str | None = Header(de
         
         # Update lead if email present
         if email_val:
-            existing = (
-                db.query(Lead)
-                .filter(Lead.client_id == client_id)
-                .order_by(Lead.id.desc())
-                .first()
-            )
-            if existing:
-                if name_val is not None:
-                    existing.name = name_val
-                if email_val is not None:
-                    existing.email = email_val
-                db.add(existing)
-            else:
-                new_lead = Lead(user_id=sess.user_id, client_id=client_id, name=name_val or '', email=str(email_val))
-                db.add(new_lead)
+            _upsert_lead(db, sess.user_id, client_id, name=name_val, email=str(email_val))
         
         db.commit()
         return {"saved": True, "data": normalized}
@@ -893,11 +1196,15 @@ async def submit_dynamic_form(payload: dict, x_client_id: str | None = Header(de
 
 # Chat/message aliases under /api for embedders that prefix paths
 @app.post("/api/chat", response_model=ChatResponseOut)
-async def chat_api(chat_data: ChatIn, x_client_id: str | None = Header(default=None), db: Session = Depends(get_db)):
-    return await chat(chat_data=chat_data, x_client_id=x_client_id, db=db)
+async def chat_api(chat_data: ChatIn, x_client_id: str | None = Header(default=None), x_forwarded_for: str | None = Header(default=None), x_real_ip: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
+    return await chat(chat_data=chat_data, x_client_id=x_client_id, x_forwarded_for=x_forwarded_for, x_real_ip=x_real_ip, db=db)
+
+@app.post("/api/chat/stream")
+async def chat_stream_api(chat_data: ChatIn, x_client_id: str | None = Header(default=None), x_forwarded_for: str | None = Header(default=None), x_real_ip: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
+    return await chat_stream(chat_data=chat_data, x_client_id=x_client_id, x_forwarded_for=x_forwarded_for, x_real_ip=x_real_ip, db=db)
 
 @app.get("/api/messages")
-async def get_messages_api(x_client_id: str | None = Header(default=None), db: Session = Depends(get_db)):
+async def get_messages_api(x_client_id: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)):
     return await get_messages(x_client_id=x_client_id, db=db)
 
 @app.post("/system-prompt", response_model=SystemPromptOut)
@@ -914,6 +1221,7 @@ async def set_system_prompt(prompt_data: SystemPromptIn, db: Session = Depends(g
             is_default=True
         )
         db.add(new_prompt)
+        _invalidate_config(db)
         db.commit()
 
         return SystemPromptOut(text=prompt_data.text, is_custom=True)
@@ -928,6 +1236,7 @@ async def reset_system_prompt(db: Session = Depends(get_db), _: bool = Depends(r
         existing_prompt = db.query(Prompt).filter(Prompt.is_default == True).first()
         if existing_prompt:
             db.delete(existing_prompt)
+            _invalidate_config(db)
             db.commit()
         
         return {"message": "System prompt reset to default"}
@@ -937,7 +1246,7 @@ async def reset_system_prompt(db: Session = Depends(get_db), _: bool = Depends(r
 
 @app.post("/documents/upload", response_model=DocumentUploadOut)
 async def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db), _: bool = Depends(require_admin)):
-    """Upload and process a document for the knowledge base"""
+    """Upload a document for the knowledge base; extraction and indexing run as a background job"""
     try:
         # Validate file type
         allowed_extensions = {'.pdf', '.docx', '.txt'}
@@ -950,8 +1259,11 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # Process document with RAG service
-        document = rag_service.process_document(db, str(file_path), file.filename)
+        # Register the document and queue it; poll /documents/jobs/{job_id} for progress
+        document = rag_service.create_document(db, str(file_path), file.filename)
+        job = ingestion_queue.enqueue(db, document)
+        db.commit()
+        ingestion_queue.notify()
         
         return DocumentUploadOut(
             id=document.id,
@@ -959,7 +1271,8 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
             document_type=document.document_type,
             upload_date=document.upload_date.isoformat(),
             processed=document.processed,
-            chunk_count=document.chunk_count
+            chunk_count=document.chunk_count,
+            job_id=job.id
         )
         
     except Exception as e:
@@ -985,6 +1298,27 @@ async def list_documents(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
 
+@app.get("/documents/jobs/{job_id}", response_model=IngestionJobOut)
+async def get_ingestion_job(job_id: int, db: Session = Depends(get_db), _: bool = Depends(require_admin)):
+    """Status and progress of a background document ingestion job"""
+    job = db.get(IngestionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    doc = db.get(KnowledgeDocument, job.document_id)
+    return IngestionJobOut(
+        id=job.id,
+        document_id=job.document_id,
+        status=job.status,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        error=job.error,
+        processed=bool(doc.processed) if doc else False,
+        chunk_count=doc.chunk_count if doc else 0,
+        created_at=job.created_at.isoformat() if job.created_at else None,
+        started_at=job.started_at.isoformat() if job.started_at else None,
+        finished_at=job.finished_at.isoformat() if job.finished_at else None
+    )
+
 @app.delete("/documents/{document_id}", response_model=DocumentDeleteOut)
 async def delete_document(document_id: int, db: Session = Depends(get_db), _: bool = Depends(require_admin)):
     """Delete a document from the knowledge base"""
@@ -1768,9 +2102,29 @@ async def debug_db_status(db: Session = Depends(get_db)):
             "container_working_directory": os.getcwd()
         }
 
+@app.get("/debug/cache-stats")
+async def debug_cache_stats(_: bool = Depends(require_admin)):
+    """Entry counts and hit / miss counters of the in-process caches"""
+    return {
+        "config": config_cache.stats(),
+        "history_windows": history_cache.stats(),
+        "responses": rag_service.response_cache.stats(),
+        "query_embeddings": rag_service.query_embeddings.stats(),
+        "token_counts": token_cache_stats(),
+        "model_routes": rag_service.model_router.stats(),
+    }
+
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "warmup": rag_service.warmup_status()}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the embedding model and vector store are loaded"""
+    status = rag_service.warmup_status()
+    if status["state"] != "ready":
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": status})
+    return {"status": "ready", "warmup": status}
 
 # ---------------------- FAQ endpoints ----------------------
 
@@ -1801,6 +2155,7 @@ async def upload_faqs_csv(file: UploadFile = File(...), db: Session = Depends(ge
 
         created = 0
         skipped = 0
+        new_faqs: list[FAQ] = []
         for row in reader:
             try:
                 values = list(row.values())
@@ -1811,11 +2166,21 @@ async def upload_faqs_csv(file: UploadFile = File(...), db: Session = Depends(ge
                     continue
                 faq = FAQ(question=question, answer=answer)
                 db.add(faq)
+                new_faqs.append(faq)
                 created += 1
             except Exception:
                 skipped += 1
         if created:
+            db.flush()
+            added = [(f.id, f.question, f.answer) for f in new_faqs]
+            faq_version = version_registry.bump(db, FAQ_VERSION)
             db.commit()
+            rag_service.apply_faq_changes(faq_version, added=added)
+            # Embed the new questions once for semantic FAQ matching (off the event loop)
+            try:
+                await asyncio.get_running_loop().run_in_executor(rag_service.executor, rag_service.index_faq_embeddings, added)
+            except Exception as e:
+                print(f"⚠️ FAQ embedding failed (will be backfilled on restart): {e}")
         return {"created": created, "skipped": skipped}
     except HTTPException:
         raise
@@ -1840,7 +2205,15 @@ async def delete_faq(faq_id: int, db: Session = Depends(get_db), _: bool = Depen
         if not faq:
             raise HTTPException(status_code=404, detail="FAQ not found")
         db.delete(faq)
+        faq_version = version_registry.bump(db, FAQ_VERSION)
         db.commit()
+        rag_service.apply_faq_changes(faq_version, removed=[faq_id])
+        # The FAQ is already gone; a stale embedding is harmless (semantic hits are checked
+        # against the FAQ index), so a Chroma failure is logged rather than turned into a 500
+        try:
+            await asyncio.get_running_loop().run_in_executor(rag_service.executor, rag_service.remove_faq_embeddings, [faq_id])
+        except Exception as e:
+            print(f"⚠️ FAQ embedding removal failed for FAQ {faq_id}: {e}")
         return {"success": True}
     except HTTPException:
         raise
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON, Boolean, Index, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -7,7 +7,7 @@ from db import Base
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    external_user_id: Mapped[str] = mapped_column(String(128), index=True, nullable=False)
+    external_user_id: Mapped[str] = mapped_column(String(128), nullable=False)
     name: Mapped[str | None] = mapped_column(String(255), nullable=True)
     email: Mapped[str | None] = mapped_column(String(255), nullable=True)
     ip_address: Mapped[str | None] = mapped_column(String(45), nullable=True)  # IPv6 support
@@ -16,6 +16,9 @@ class User(Base):
 
     sessions = relationship("Session", back_populates="user")
 
+    # One user per widget client id (lets the chat path upsert with ON CONFLICT)
+    __table_args__ = (Index("uq_users_external_user_id", "external_user_id", unique=True),)
+
 from datetime import datetime
 
 class Session(Base):
@@ -28,20 +31,37 @@ class Session(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     closed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     last_message_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Bumped with every message insert, in the same transaction; keys the cached history window
+    message_version: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"), nullable=False)
 
     user = relationship("User", back_populates="sessions")
     messages = relationship("Message", back_populates="session")
 
+    # At most one open session per user
+    __table_args__ = (
+        Index(
+            "uq_sessions_user_id_open",
+            "user_id",
+            unique=True,
+            postgresql_where=text("status = 'open'"),
+            sqlite_where=text("status = 'open'"),
+        ),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     session_id: Mapped[int] = mapped_column(ForeignKey("sessions.id", ondelete="CASCADE"), index=True)
     role: Mapped[str] = mapped_column(String(16))  # "user" / "assistant" / "system"
     content: Mapped[str] = mapped_column(Text)
+    token_count: Mapped[int | None] = mapped_column(Integer, nullable=True)  # tokens in content (OPENAI_MODEL encoding); NULL on legacy rows
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     session = relationship("Session", back_populates="messages")
 
+    # Newest-first history scans per session
+    __table_args__ = (Index("ix_messages_session_id_id_desc", "session_id", text("id DESC")),)
+
 class FAQ(Base):
     __tablename__ = "faqs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -79,6 +99,20 @@ class DocumentChunk(Base):
     chunk_index: Mapped[int] = mapped_column(Integer)  # Order of chunk in document
     vector_id: Mapped[str] = mapped_column(String(255))  # ID in vector database
 
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    # DB-backed work queue for document ingestion; claimed by background workers
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    document_id: Mapped[int] = mapped_column(ForeignKey("knowledge_documents.id", ondelete="CASCADE"), index=True)
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True)  # queued, running, done, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())  # not claimed before this (retry backoff)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
 class DocumentVisibility(Base):
     __tablename__ = "document_visibility"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -99,11 +133,14 @@ class Lead(Base):
     __tablename__ = "leads"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), index=True)
-    client_id: Mapped[str] = mapped_column(String(128), index=True)
+    client_id: Mapped[str] = mapped_column(String(128))
     name: Mapped[str] = mapped_column(String(255))
     email: Mapped[str] = mapped_column(String(255))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+    # One lead per widget client id (lets the chat path upsert with ON CONFLICT)
+    __table_args__ = (Index("uq_leads_client_id", "client_id", unique=True),)
+
 class WidgetConfig(Base):
     __tablename__ = "widget_config"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -151,3 +188,28 @@ class StarterQuestions(Base):
     # Dynamic questions stored as JSON array
     questions: Mapped[list] = mapped_column(JSON, default=list)
     enabled: Mapped[bool | None] = mapped_column(Boolean, nullable=True, default=True)
+
+class IntentTriggers(Base):
+    __tablename__ = "intent_triggers"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Trigger phrase lists (JSON arrays) compiled into the chat intent router
+    casual_phrases: Mapped[list] = mapped_column(JSON, default=list)
+    skip_kb_terms: Mapped[list] = mapped_column(JSON, default=list)
+    kb_terms: Mapped[list] = mapped_column(JSON, default=list)
+    kb_long_terms: Mapped[list] = mapped_column(JSON, default=list)
+    kb_long_min_words: Mapped[int] = mapped_column(Integer, default=8)
+    handoff_terms: Mapped[list] = mapped_column(JSON, default=list)
+
+class ModelRoute(Base):
+    __tablename__ = "model_routes"
+    # Admin overrides of the chat model routing policy, one row per turn class
+    turn_class: Mapped[str] = mapped_column(String(32), primary_key=True)
+    model: Mapped[str | None] = mapped_column(String(100), nullable=True)  # NULL = configured ai_model
+    max_tokens: Mapped[int] = mapped_column(Integer, default=800)
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    # Named counters (e.g. "config") bumped on every write to the data they guard.
+    # In-process caches in each worker poll these to know when to reload.
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,64 @@
+"""
+Idempotent schema upgrades applied at startup.
+
+`Base.metadata.create_all` creates missing tables but never alters existing
+ones, so columns and indexes added to existing tables are applied here. Every
+step checks the live schema first and is safe to run on every boot.
+"""
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.engine import Engine
+
+from models import Lead, Message, Session, User
+
+# Set once the unique indexes behind the visitor / open-session / lead upserts exist.
+# Until then (duplicates still in the DB) the chat path uses select-then-insert.
+visitor_constraints_ready = False
+
+
+def _add_column_if_missing(conn, table: str, column: str, ddl_type: str) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+        print(f"✅ Added column {table}.{column}")
+
+
+def _index_exists(engine: Engine, index: Index) -> bool:
+    return index.name in {i["name"] for i in inspect(engine).get_indexes(index.table.name)}
+
+
+def _ensure_index(engine: Engine, index: Index) -> bool:
+    """Create `index` if missing; returns whether it exists afterwards."""
+    try:
+        with engine.begin() as conn:
+            index.create(conn, checkfirst=True)
+        return True
+    except Exception as e:
+        # Another worker may have created it concurrently
+        if _index_exists(engine, index):
+            return True
+        print(f"⚠️ Could not create index {index.name}: {e}")
+        return False
+
+
+def apply_schema_upgrades(engine: Engine) -> None:
+    global visitor_constraints_ready
+
+    with engine.begin() as conn:
+        _add_column_if_missing(conn, "messages", "token_count", "INTEGER")
+        _add_column_if_missing(conn, "sessions", "message_version", "INTEGER NOT NULL DEFAULT 0")
+    for index in Message.__table__.indexes:
+        _ensure_index(engine, index)
+
+    ready = all([
+        _ensure_index(engine, index)
+        for index in (*User.__table__.indexes, *Session.__table__.indexes, *Lead.__table__.indexes)
+    ])
+    if ready:
+        # Superseded by uq_users_external_user_id / uq_leads_client_id
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS ix_users_external_user_id"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_leads_client_id"))
+    else:
+        print("⚠️ Duplicate users / open sessions / leads prevent the unique indexes; run "
+              "`python compact_duplicates.py` from the app directory, then restart")
+    visitor_constraints_ready = ready
@@ -62,6 +62,20 @@ class DocumentUploadOut(BaseModel):
     upload_date: str
     processed: bool
     chunk_count: int
+    job_id: Optional[int] = None  # background ingestion job (set on upload)
+
+class IngestionJobOut(BaseModel):
+    id: int
+    document_id: int
+    status: str  # queued, running, done, failed
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    processed: bool
+    chunk_count: int
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
 
 class DocumentListOut(BaseModel):
     documents: List[DocumentUploadOut]
@@ -161,6 +175,38 @@ class StarterQuestionsIn(BaseModel):
     questions: List[str] = []
     enabled: Optional[bool] = None
 
+class IntentTriggersOut(BaseModel):
+    casual_phrases: List[str] = []
+    skip_kb_terms: List[str] = []
+    kb_terms: List[str] = []
+    kb_long_terms: List[str] = []
+    kb_long_min_words: int = 8
+    handoff_terms: List[str] = []
+
+class IntentTriggersIn(BaseModel):
+    casual_phrases: Optional[List[str]] = None
+    skip_kb_terms: Optional[List[str]] = None
+    kb_terms: Optional[List[str]] = None
+    kb_long_terms: Optional[List[str]] = None
+    kb_long_min_words: Optional[int] = None
+    handoff_terms: Optional[List[str]] = None
+
+class ModelRouteOut(BaseModel):
+    turn_class: str
+    model: Optional[str] = None  # None = configured ai_model
+    max_tokens: int
+    hits: int = 0
+
+class ModelRouteIn(BaseModel):
+    turn_class: str
+    model: Optional[str] = None
+    max_tokens: Optional[int] = None
+
+class WidgetBootstrapOut(BaseModel):
+    widget_config: WidgetConfigOut
+    messaging_config: MessagingConfigOut
+    starter_questions: StarterQuestionsOut
+
 # Inbox schemas
 class ChatMessageOut(BaseModel):
     id: int
@@ -0,0 +1,143 @@
+"""
+Versioned in-process caches for rarely-changing rows (system prompt, widget /
+messaging config, starter questions).
+
+Writers call `version_registry.bump(db, name)` inside their transaction; the
+counter lives in the `cache_versions` table so every worker sees it. Readers
+compare their cached entry against the counter, which is re-read from the DB at
+most once per CONFIG_CACHE_TTL_SECONDS (immediately after a local commit that
+bumped it), so cross-worker staleness is bounded by the TTL.
+"""
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import CacheVersion
+
+CONFIG_VERSION = "config"
+FAQ_VERSION = "faq"
+KB_VERSION = "kb"
+
+_PENDING_BUMPS_KEY = "pending_cache_version_bumps"
+
+
+class VersionRegistry:
+    """Process-local view of the `cache_versions` counters, refreshed on a TTL."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._versions: dict[str, int] = {}
+        self._checked_at: Optional[float] = None
+
+    def current(self, db: Session, name: str) -> int:
+        """Return the latest known version of `name`, polling the DB if the TTL elapsed."""
+        now = time.monotonic()
+        checked_at = self._checked_at
+        if checked_at is None or now - checked_at >= self.ttl_seconds:
+            rows = db.execute(select(CacheVersion.name, CacheVersion.version)).all()
+            with self._lock:
+                self._versions = {row_name: row_version for row_name, row_version in rows}
+                self._checked_at = now
+        return self._versions.get(name, 0)
+
+    def expire(self) -> None:
+        """Force the next read to poll the DB."""
+        with self._lock:
+            self._checked_at = None
+
+    def bump(self, db: Session, name: str) -> int:
+        """Increment `name` within the caller's transaction (takes effect on commit).
+        Returns the new version so callers can patch their caches incrementally."""
+        increment = (
+            update(CacheVersion)
+            .where(CacheVersion.name == name)
+            .values(version=CacheVersion.version + 1)
+            .returning(CacheVersion.version)
+        )
+        new_version = db.execute(increment).scalar_one_or_none()
+        if new_version is None:
+            # First bump of this counter: create it (a concurrent first bump may win), then increment
+            _create_counter(db, name)
+            new_version = db.execute(increment).scalar_one()
+        db.info.setdefault(_PENDING_BUMPS_KEY, set()).add(name)
+        return new_version
+
+
+def _create_counter(db: Session, name: str) -> None:
+    """Insert the `name` counter at 0 unless it already exists (INSERT ... ON CONFLICT DO NOTHING)."""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        db.execute(
+            insert(CacheVersion)
+            .values(name=name, version=0)
+            .on_conflict_do_nothing(index_elements=[CacheVersion.name])
+        )
+        return
+    try:
+        with db.begin_nested():
+            db.add(CacheVersion(name=name, version=0))
+    except IntegrityError:
+        pass
+
+
+class ConfigCache:
+    """Key -> value cache whose entries are tagged with a version counter."""
+
+    def __init__(self, registry: VersionRegistry, version_name: str = CONFIG_VERSION):
+        self.registry = registry
+        self.version_name = version_name
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[int, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, db: Session) -> int:
+        return self.registry.current(db, self.version_name)
+
+    def get(self, db: Session, key: str, loader: Callable[[Session], Any]) -> Any:
+        """Return the cached value for `key`, calling `loader(db)` when missing or stale.
+        Cached values are shared between requests; callers must not mutate them.
+        """
+        version = self.version(db)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = loader(db)
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+version_registry = VersionRegistry(settings.CONFIG_CACHE_TTL_SECONDS)
+config_cache = ConfigCache(version_registry)
+
+
+@event.listens_for(Session, "after_commit")
+def _expire_after_bump(session: Session) -> None:
+    # Only re-poll once the new version is committed, so a concurrent reader in this
+    # worker can't tag pre-commit data with the post-commit version.
+    if session.info.pop(_PENDING_BUMPS_KEY, None):
+        version_registry.expire()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_bumps(session: Session) -> None:
+    session.info.pop(_PENDING_BUMPS_KEY, None)
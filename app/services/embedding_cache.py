@@ -0,0 +1,49 @@
+"""
+LRU of query embeddings keyed on normalized query text.
+
+Visitors ask the same questions (starter questions above all), and each KB /
+semantic FAQ lookup would otherwise run a model forward pass for them. Vectors
+are stored as unit-length float32 arrays and shared read-only between callers.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._vectors
+
+    def stats(self) -> dict:
+        return {"entries": len(self._vectors), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,81 @@
+"""
+Embedding backends for all-MiniLM-L6-v2, selected by `settings.EMBEDDING_BACKEND`.
+
+- "sentence-transformers": the original PyTorch model
+- "fastembed": the same weights exported to ONNX and run by ONNX Runtime
+  (no torch import: lower per-query latency and a much smaller worker RSS)
+- "auto": fastembed when installed, otherwise sentence-transformers
+
+Both apply mean pooling and return unit-length float32 vectors with the same
+384 dimensions, so vectors from either backend can be compared with the ones
+already stored in the Chroma collections (cosine space).
+"""
+from typing import List
+
+import numpy as np
+
+SENTENCE_TRANSFORMERS_MODEL = "all-MiniLM-L6-v2"
+FASTEMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingBackend:
+    """encode(texts) -> float32 array of shape (len(texts), dim), rows unit-length."""
+    name = "base"
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = SENTENCE_TRANSFORMERS_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return _normalize(self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True))
+
+
+class FastEmbedBackend(EmbeddingBackend):
+    name = "fastembed"
+
+    def __init__(self, model_name: str = FASTEMBED_MODEL, threads: int | None = None):
+        from fastembed import TextEmbedding
+        # Cache dir comes from FASTEMBED_CACHE_PATH (prefetched into the image by the Dockerfile)
+        self.model = TextEmbedding(model_name=model_name, threads=threads)
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return _normalize(np.vstack(list(self.model.embed(texts, batch_size=batch_size))))
+
+
+def load_embedding_backend(name: str, threads: int | None = None) -> EmbeddingBackend:
+    name = (name or "auto").strip().lower()
+    if name in ("fastembed", "onnx"):
+        return FastEmbedBackend(threads=threads)
+    if name in ("sentence-transformers", "sentence_transformers", "torch"):
+        return SentenceTransformerBackend()
+    if name != "auto":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {name!r}")
+    try:
+        return FastEmbedBackend(threads=threads)
+    except ImportError:
+        return SentenceTransformerBackend()
+    except Exception as e:
+        print(f"⚠️ fastembed backend unavailable ({e}), falling back to sentence-transformers")
+        return SentenceTransformerBackend()
@@ -0,0 +1,207 @@
+"""
+In-memory trigram index over the FAQ table.
+
+FAQ scoring matches query words as *substrings* of the question / answer text,
+so a plain word index can't reproduce it. Instead every FAQ slot is recorded in
+a bitset per character trigram; a word's candidate FAQs are the AND of its
+trigram bitsets, and only those candidates are checked with a real substring
+test. A chat turn therefore touches the handful of FAQs that can match instead
+of lower-casing and scanning the whole table.
+
+The index is kept in step with the `faq` version counter: FAQ writers patch it
+in place, and a version mismatch (another worker wrote) triggers a full rebuild.
+Rebuilds are built into fresh structures off the request path and swapped in
+under the lock, so searches keep using the previous index until then.
+"""
+import threading
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import FAQ
+from services.config_cache import version_registry, FAQ_VERSION
+
+
+class _Entry(NamedTuple):
+    faq_id: int
+    question: str
+    answer: str
+    question_lower: str
+    answer_lower: str
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class FAQIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._slots: list[Optional[_Entry]] = []
+        self._slot_by_id: dict[int, int] = {}
+        self._question_grams: dict[str, int] = {}
+        self._answer_grams: dict[str, int] = {}
+        self._version: Optional[int] = None
+
+    # ----- maintenance -----
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    def is_current(self, db: Session) -> bool:
+        """Whether the index matches the shared FAQ version (cheap; never rebuilds)."""
+        return self._version == version_registry.current(db, FAQ_VERSION)
+
+    def rebuild(self, db: Session, version: Optional[int] = None) -> None:
+        """Full rebuild from the DB (blocking: run it in a background thread, not on the event loop)."""
+        if version is None:
+            version = version_registry.current(db, FAQ_VERSION)
+        rows = db.query(FAQ.id, FAQ.question, FAQ.answer).order_by(FAQ.id).all()
+        self.rebuild_from_rows(rows, version)
+
+    def rebuild_from_rows(self, rows: Iterable[Tuple[int, str, str]], version: Optional[int]) -> None:
+        fresh = FAQIndex()
+        for faq_id, question, answer in rows:
+            fresh._add(faq_id, question, answer)
+        with self._lock:
+            if self._version is not None and version is not None and self._version > version:
+                # A newer write was patched in while this was building
+                return
+            self._slots = fresh._slots
+            self._slot_by_id = fresh._slot_by_id
+            self._question_grams = fresh._question_grams
+            self._answer_grams = fresh._answer_grams
+            self._version = version
+
+    def apply(self, version: int, added: Iterable[Tuple[int, str, str]] = (), removed: Iterable[int] = ()) -> None:
+        """Patch the index after a committed FAQ write that bumped the version to `version`.
+        If the index isn't exactly one version behind, another worker wrote in between,
+        so it is marked stale (and keeps serving) until a background rebuild replaces it.
+        """
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                self._version = None
+                return
+            for faq_id in removed:
+                self._remove(faq_id)
+            for faq_id, question, answer in added:
+                self._add(faq_id, question, answer)
+            self._version = version
+
+    def _add(self, faq_id: int, question: str, answer: str) -> None:
+        if faq_id in self._slot_by_id:
+            self._remove(faq_id)
+        entry = _Entry(faq_id, question, answer, question.lower(), answer.lower())
+        slot = len(self._slots)
+        self._slots.append(entry)
+        self._slot_by_id[faq_id] = slot
+        bit = 1 << slot
+        for gram in _trigrams(entry.question_lower):
+            self._question_grams[gram] = self._question_grams.get(gram, 0) | bit
+        for gram in _trigrams(entry.answer_lower):
+            self._answer_grams[gram] = self._answer_grams.get(gram, 0) | bit
+
+    def _remove(self, faq_id: int) -> None:
+        slot = self._slot_by_id.pop(faq_id, None)
+        if slot is None:
+            return
+        entry = self._slots[slot]
+        self._slots[slot] = None
+        clear = ~(1 << slot)
+        for grams, text in ((self._question_grams, entry.question_lower), (self._answer_grams, entry.answer_lower)):
+            for gram in _trigrams(text):
+                bits = grams.get(gram, 0) & clear
+                if bits:
+                    grams[gram] = bits
+                else:
+                    grams.pop(gram, None)
+
+    # ----- lookup -----
+    def get(self, faq_id: int) -> Optional[_Entry]:
+        with self._lock:
+            slot = self._slot_by_id.get(faq_id)
+            return self._slots[slot] if slot is not None else None
+
+    def _substring_mask(self, grams: dict[str, int], needle: str, field: str) -> int:
+        """Bitset of FAQ slots whose `field` contains `needle`."""
+        if len(needle) < 3:
+            # Too short for trigrams: fall back to a scan (only hit by very short whole queries)
+            candidates = 0
+            for slot, entry in enumerate(self._slots):
+                if entry is not None:
+                    candidates |= 1 << slot
+        else:
+            candidates = None
+            for gram in _trigrams(needle):
+                bits = grams.get(gram, 0)
+                candidates = bits if candidates is None else candidates & bits
+                if not candidates:
+                    return 0
+        matched = 0
+        for slot in _iter_bits(candidates):
+            if needle in getattr(self._slots[slot], field):
+                matched |= 1 << slot
+        return matched
+
+    def search(self, query: str, limit: int = 3) -> List[Tuple[str, float, dict]]:
+        """Score FAQs exactly like the original full-table scan and return the top `limit`.
+        - whole query contained in the question: exact match (distance 0.0)
+        - each query word > 2 chars: +3 if in the question, +1 if in the answer
+        - each query word > 3 chars: another +2 / +1 (the old "partial match" pass)
+        """
+        query_lower = query.lower()
+        query_words = query_lower.split()
+        with self._lock:
+            if not self._slot_by_id:
+                return []
+            exact = self._substring_mask(self._question_grams, query_lower, "question_lower")
+            question_hits: dict[str, int] = {}
+            answer_hits: dict[str, int] = {}
+            candidates = exact
+            for word in set(query_words):
+                if len(word) > 2:
+                    question_hits[word] = self._substring_mask(self._question_grams, word, "question_lower")
+                    answer_hits[word] = self._substring_mask(self._answer_grams, word, "answer_lower")
+                    candidates |= question_hits[word] | answer_hits[word]
+
+            faq_results = []
+            for slot in _iter_bits(candidates):
+                bit = 1 << slot
+                if exact & bit:
+                    distance = 0.0
+                else:
+                    score = 0
+                    for word in query_words:
+                        if len(word) > 2:
+                            if question_hits[word] & bit:
+                                score += 3
+                            if answer_hits[word] & bit:
+                                score += 1
+                    for word in query_words:
+                        if len(word) > 3:
+                            if question_hits[word] & bit:
+                                score += 2
+                            if answer_hits[word] & bit:
+                                score += 1
+                    if score <= 0:
+                        continue
+                    normalized_score = min(1.0, score / max(1, len(query_words) * 3))
+                    distance = 1.0 - normalized_score
+                entry = self._slots[slot]
+                faq_text = f"Q: {entry.question}\nA: {entry.answer}"
+                faq_results.append((
+                    faq_text,
+                    distance,
+                    {"source": "faq", "faq_id": entry.faq_id, "question": entry.question}
+                ))
+
+        # Sort by distance (lower is better), ties by FAQ id like the old table-order scan
+        faq_results.sort(key=lambda x: (x[1], x[2]["faq_id"]))
+        return faq_results[:limit]
@@ -0,0 +1,87 @@
+"""
+Per-session cache of the token-budgeted conversation window.
+
+Each entry holds the newest user/assistant messages of one chat session that
+fit CHAT_HISTORY_MAX_TOKENS, with their token costs. The chat turn writes its
+user and assistant messages through to the cached window, so the next turn
+(and /messages) can skip the history query. Entries are tagged with the
+session's `message_version`, which every message insert bumps in the same
+transaction. The version arrives with the session row the caller already
+loaded, so validating an entry costs no query; a message written by another
+worker, or a deleted session, just causes a reload.
+"""
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+
+class HistoryTurn(NamedTuple):
+    id: int
+    role: str
+    content: str
+    tokens: int  # content tokens + per-message overhead
+
+
+def fit_to_budget(turns: List[HistoryTurn], budget: int) -> List[HistoryTurn]:
+    """Newest messages that fit `budget`, oldest first (stops at the first that doesn't fit)."""
+    total = 0
+    start = len(turns)
+    while start > 0 and total + turns[start - 1].tokens <= budget:
+        start -= 1
+        total += turns[start].tokens
+    return turns[start:]
+
+
+class HistoryWindowCache:
+    def __init__(self, max_sessions: int, budget: int):
+        self.max_sessions = max_sessions
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._windows: "OrderedDict[int, tuple[int, List[HistoryTurn]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: int, version: int) -> Optional[List[HistoryTurn]]:
+        """Cached window for the session if its messages are still at `version`."""
+        with self._lock:
+            entry = self._windows.get(session_id)
+            if entry is not None:
+                if entry[0] == version:
+                    self._windows.move_to_end(session_id)
+                    self.hits += 1
+                    return entry[1]
+                del self._windows[session_id]
+            self.misses += 1
+            return None
+
+    def put(self, session_id: int, version: int, turns: List[HistoryTurn]) -> None:
+        if self.max_sessions <= 0:
+            return
+        with self._lock:
+            self._windows[session_id] = (version, list(turns))
+            self._windows.move_to_end(session_id)
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+
+    def append(self, session_id: int, version: int, turn: HistoryTurn) -> None:
+        """Write a newly committed message through to the session's cached window.
+        `version` is the session's message_version after that message's insert."""
+        with self._lock:
+            entry = self._windows.get(session_id)
+            if entry is None:
+                return
+            cached_version, turns = entry
+            if cached_version != version - 1:
+                # Another message landed in between (concurrent turns): let the next read reload it
+                del self._windows[session_id]
+                return
+            # Copy-on-write: readers may still hold the previous list
+            self._windows[session_id] = (version, fit_to_budget(turns + [turn], self.budget))
+            self._windows.move_to_end(session_id)
+
+    def invalidate(self, session_id: int) -> None:
+        with self._lock:
+            self._windows.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._windows), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,240 @@
+"""
+Hybrid retrieval: BM25 over FAQ rows and document chunks, fused with the
+vector (Chroma) hits by reciprocal rank fusion.
+
+Raw BM25 scores and cosine distances live on different scales, so results are
+never merged by comparing them. Each retriever only contributes a *ranking*;
+RRF orders the union by sum(1 / (RRF_K + rank)). The score reported with each
+hit is calibrated to [0, 1] from absolute evidence, so thresholds mean the same
+thing whichever retriever found it:
+- vector: cosine similarity (1 - cosine distance)
+- lexical: IDF-weighted share of the query terms the text contains
+and a hit's score is the stronger of the two.
+
+Like FAQIndex, the BM25 index follows the shared `faq` / `kb` version counters.
+Writers patch it in place (per FAQ / per document) after their commit; a
+version mismatch marks it stale and a full rebuild runs in the background,
+built into fresh structures and swapped in, while searches keep using the old
+one. Only postings, lengths and small metadata are held: hit text comes from
+the FAQ index or the vector store. Removed docs are tombstoned until the next
+rebuild compacts them.
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import FAQ, DocumentChunk, KnowledgeDocument
+from services.config_cache import version_registry, FAQ_VERSION, KB_VERSION
+
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rebuild (compact) once tombstones outnumber this share of the live docs
+BM25_MAX_DEAD_RATIO = 0.5
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its me my "
+    "of on or our so that the their there this to us was we were what when where which who "
+    "why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+def term_counts(text: str) -> Counter:
+    return Counter(tokenize(text))
+
+
+class _Doc(NamedTuple):
+    key: Tuple[str, Hashable]  # ("faq", faq_id) or ("kb", vector_id)
+    metadata: dict
+    length: int
+
+
+class HybridHit(NamedTuple):
+    text: str
+    score: float  # calibrated relevance in [0, 1]
+    metadata: dict
+
+
+class BM25Index:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs: List[Optional[_Doc]] = []  # None = tombstone
+        self._slot_by_key: Dict[Tuple[str, Hashable], int] = {}
+        self._slots_by_document: Dict[int, List[int]] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+        self._faq_version: Optional[int] = None
+        self._kb_version: Optional[int] = None
+
+    # ----- maintenance -----
+    @property
+    def needs_compaction(self) -> bool:
+        live = len(self._slot_by_key)
+        return len(self._docs) - live > max(100, BM25_MAX_DEAD_RATIO * live)
+
+    def is_current(self, db: Session) -> bool:
+        """Whether the index matches the shared versions (cheap; never rebuilds)."""
+        return (self._faq_version == version_registry.current(db, FAQ_VERSION)
+                and self._kb_version == version_registry.current(db, KB_VERSION))
+
+    def rebuild(self, db: Session) -> None:
+        """Full rebuild from the DB (blocking: run it in a background thread, not on the event loop)."""
+        faq_version = version_registry.current(db, FAQ_VERSION)
+        kb_version = version_registry.current(db, KB_VERSION)
+        fresh = BM25Index()
+        for faq_id, question, answer in db.query(FAQ.id, FAQ.question, FAQ.answer).order_by(FAQ.id).yield_per(1000):
+            fresh._add_faq(faq_id, question, answer)
+        chunks = (
+            db.query(DocumentChunk.vector_id, DocumentChunk.chunk_text, DocumentChunk.chunk_index,
+                     KnowledgeDocument.id, KnowledgeDocument.filename)
+            .join(KnowledgeDocument, DocumentChunk.document_id == KnowledgeDocument.id)
+            .order_by(DocumentChunk.id)
+            .yield_per(1000)
+        )
+        for vector_id, chunk_text, chunk_index, document_id, filename in chunks:
+            fresh._add_chunk(document_id, filename, vector_id, chunk_index, term_counts(chunk_text))
+
+        with self._lock:
+            if ((self._faq_version is not None and self._faq_version > faq_version)
+                    or (self._kb_version is not None and self._kb_version > kb_version)):
+                # A newer write was patched in while this was building; the next pass catches up
+                return
+            self._docs = fresh._docs
+            self._slot_by_key = fresh._slot_by_key
+            self._slots_by_document = fresh._slots_by_document
+            self._postings = fresh._postings
+            self._total_length = fresh._total_length
+            self._faq_version = faq_version
+            self._kb_version = kb_version
+
+    def apply_faqs(self, version: int, added: Iterable[Tuple[int, str, str]] = (), removed: Iterable[int] = ()) -> None:
+        """Patch FAQ docs after a committed write that bumped the faq version to `version`
+        (stale instead when another worker wrote in between, like FAQIndex.apply)."""
+        with self._lock:
+            if self._faq_version is None or version != self._faq_version + 1:
+                self._faq_version = None
+                return
+            for faq_id in removed:
+                self._remove(("faq", faq_id))
+            for faq_id, question, answer in added:
+                self._add_faq(faq_id, question, answer)
+            self._faq_version = version
+
+    def apply_document(self, version: int, document_id: int, filename: str = "",
+                       chunks: Iterable[Tuple[str, int, Counter]] = ()) -> None:
+        """Replace a document's chunks ((vector_id, chunk_index, term_counts) each; none = deleted)
+        after a committed write that bumped the kb version to `version`."""
+        with self._lock:
+            if self._kb_version is None or version != self._kb_version + 1:
+                self._kb_version = None
+                return
+            for slot in self._slots_by_document.pop(document_id, []):
+                doc = self._docs[slot]
+                if doc is not None:
+                    self._remove(doc.key)
+            for vector_id, chunk_index, terms in chunks:
+                self._add_chunk(document_id, filename, vector_id, chunk_index, terms)
+            self._kb_version = version
+
+    def _add_faq(self, faq_id: int, question: str, answer: str) -> None:
+        self._add(("faq", faq_id), {"source": "faq", "faq_id": faq_id, "question": question},
+                  term_counts(f"{question} {answer}"))
+
+    def _add_chunk(self, document_id: int, filename: str, vector_id: str, chunk_index: int, terms: Counter) -> None:
+        slot = self._add(("kb", vector_id), {"document_id": document_id, "filename": filename,
+                                             "chunk_index": chunk_index, "vector_id": vector_id}, terms)
+        self._slots_by_document.setdefault(document_id, []).append(slot)
+
+    def _add(self, key: Tuple[str, Hashable], metadata: dict, terms: Counter) -> int:
+        self._remove(key)
+        slot = len(self._docs)
+        length = sum(terms.values())
+        self._docs.append(_Doc(key, metadata, length))
+        self._slot_by_key[key] = slot
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[slot] = tf
+        return slot
+
+    def _remove(self, key: Tuple[str, Hashable]) -> None:
+        # Postings keep the dead slot until the next rebuild; search skips tombstones
+        slot = self._slot_by_key.pop(key, None)
+        if slot is not None:
+            self._total_length -= self._docs[slot].length
+            self._docs[slot] = None
+
+    # ----- lookup -----
+    def search(self, query: str, limit: int) -> List[Tuple[Tuple[str, Hashable], dict, float]]:
+        """Top `limit` docs by BM25 as (key, metadata, coverage), best first.
+        coverage = IDF-weighted share of the query terms found in the doc."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            docs = self._docs
+            n_docs = len(self._slot_by_key)
+            if not terms or not n_docs:
+                return []
+            avg_length = (self._total_length / n_docs) or 1.0
+            live_postings = {
+                term: [(slot, tf) for slot, tf in self._postings.get(term, {}).items() if docs[slot] is not None]
+                for term in terms
+            }
+            idf = {term: math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5)) for term, p in live_postings.items()}
+            total_idf = sum(idf.values())
+            scores: Dict[int, float] = {}
+            matched_idf: Dict[int, float] = {}
+            for term, postings in live_postings.items():
+                for slot, tf in postings:
+                    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * docs[slot].length / avg_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf[term] * tf * (BM25_K1 + 1) / (tf + length_norm)
+                    matched_idf[slot] = matched_idf.get(slot, 0.0) + idf[term]
+            ranked = sorted(scores, key=lambda slot: (-scores[slot], slot))[:limit]
+            return [
+                (docs[slot].key, docs[slot].metadata, matched_idf[slot] / total_idf if total_idf else 0.0)
+                for slot in ranked
+            ]
+
+
+def hit_key(metadata: dict) -> Tuple[str, Hashable]:
+    if metadata.get("source") == "faq":
+        return ("faq", metadata.get("faq_id"))
+    return ("kb", metadata.get("vector_id"))
+
+
+def fuse(lexical: Sequence[Tuple[Tuple[str, Hashable], dict, float]],
+         vector: Sequence[Tuple[str, float, dict]],
+         limit: int,
+         min_score: float = 0.0) -> List[HybridHit]:
+    """Reciprocal rank fusion of BM25 hits and vector hits ((text, cosine distance, metadata),
+    best first). Returns up to `limit` hits, in fused order, whose calibrated score >= min_score.
+    BM25 hits carry no text, so hits only found lexically come back with text ""."""
+    fused: Dict[Tuple[str, Hashable], float] = {}
+    evidence: Dict[Tuple[str, Hashable], float] = {}
+    payload: Dict[Tuple[str, Hashable], Tuple[str, dict]] = {}
+    for rank, (key, metadata, coverage) in enumerate(lexical, start=1):
+        fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+        evidence[key] = max(evidence.get(key, 0.0), coverage)
+        payload.setdefault(key, ("", metadata))
+    for rank, (text, distance, metadata) in enumerate(vector, start=1):
+        key = hit_key(metadata)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+        evidence[key] = max(evidence.get(key, 0.0), min(1.0, max(0.0, 1.0 - distance)))
+        payload[key] = (text, {**payload.get(key, ("", {}))[1], **metadata})
+    ordered = sorted(fused, key=lambda key: -fused[key])
+    hits = []
+    for key in ordered:
+        if evidence[key] < min_score:
+            continue
+        text, metadata = payload[key]
+        hits.append(HybridHit(text, round(evidence[key], 4), {**metadata, "rrf": round(fused[key], 6)}))
+        if len(hits) >= limit:
+            break
+    return hits
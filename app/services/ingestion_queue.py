@@ -0,0 +1,201 @@
+"""
+Background document ingestion backed by the `ingestion_jobs` table.
+
+Uploads only save the file and enqueue a job; a small pool of local worker
+threads claims queued jobs (`SELECT ... FOR UPDATE SKIP LOCKED` on Postgres, so
+several app workers can share the queue) and runs the extract / chunk / embed
+pipeline. Progress shows up on the document itself (`chunk_count`, then
+`processed`). Failed jobs are re-queued with exponential backoff until
+`max_attempts`, and a job stuck in "running" past the lease (worker died) is
+claimed again. The worker renews its lease with every committed batch, and a
+claim is identified by (id, attempts): the lease renewal and the final status
+update only apply while the job is still "running" on that attempt, so a worker
+whose job was re-claimed stops instead of overwriting the new owner's state.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from db import SessionLocal
+from models import IngestionJob, KnowledgeDocument
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class LeaseLost(Exception):
+    """The job was re-claimed by another worker (or finished) while this one was running it."""
+
+
+class IngestionQueue:
+    def __init__(self, rag_service, workers: int = 1, poll_seconds: float = 5.0):
+        self.rag_service = rag_service
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    # ----- producer side -----
+    def enqueue(self, db: Session, document: KnowledgeDocument) -> IngestionJob:
+        """Add a job for `document` to the session; the caller commits, then calls notify()."""
+        job = IngestionJob(
+            document_id=document.id,
+            status="queued",
+            attempts=0,
+            max_attempts=max(1, settings.INGESTION_MAX_ATTEMPTS),
+            available_at=_utcnow(),
+        )
+        db.add(job)
+        db.flush()
+        return job
+
+    def notify(self) -> None:
+        """Wake idle workers instead of waiting for the next poll."""
+        self._wake.set()
+
+    # ----- worker lifecycle -----
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✅ Ingestion workers started ({self.workers})")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claim = self._claim()
+            except Exception as e:
+                print(f"⚠️ Ingestion queue poll failed: {e}")
+                claim = None
+            if claim is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self._execute(*claim)
+
+    # ----- claim / execute -----
+    def _claim(self) -> Optional[tuple[int, int]]:
+        """Atomically move the oldest runnable job to "running" and return (id, attempt)."""
+        db = SessionLocal()
+        try:
+            while True:
+                now = _utcnow()
+                lease_cutoff = now - timedelta(seconds=settings.INGESTION_LEASE_SECONDS)
+                stmt = (
+                    select(IngestionJob)
+                    .where(or_(
+                        and_(IngestionJob.status == "queued", IngestionJob.available_at <= now),
+                        and_(IngestionJob.status == "running", IngestionJob.started_at < lease_cutoff),
+                    ))
+                    .order_by(IngestionJob.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job = db.execute(stmt).scalar_one_or_none()
+                if job is None:
+                    db.rollback()
+                    return None
+                if job.status == "running" and job.attempts >= job.max_attempts:
+                    # Lease expired on the last attempt: give up rather than loop forever
+                    job.status = "failed"
+                    job.error = job.error or "Worker stopped while processing the document"
+                    job.finished_at = now
+                    db.commit()
+                    continue
+                job.status = "running"
+                job.attempts += 1
+                job.started_at = now
+                job.error = None
+                db.commit()
+                return job.id, job.attempts
+        finally:
+            db.close()
+
+    @staticmethod
+    def _owned(job_id: int, attempt: int):
+        return and_(IngestionJob.id == job_id, IngestionJob.status == "running", IngestionJob.attempts == attempt)
+
+    def _renew_lease(self, db: Session, job_id: int, attempt: int) -> None:
+        """Push the lease forward within the caller's transaction; raise LeaseLost if the claim is gone."""
+        result = db.execute(
+            update(IngestionJob).where(self._owned(job_id, attempt)).values(started_at=_utcnow())
+        )
+        if result.rowcount == 0:
+            raise LeaseLost(f"Ingestion job {job_id} attempt {attempt} was taken over")
+
+    def _finish(self, db: Session, job_id: int, attempt: int, status: str, error: Optional[str] = None) -> bool:
+        """Set a terminal status only if this worker still holds the claim; commits."""
+        result = db.execute(
+            update(IngestionJob)
+            .where(self._owned(job_id, attempt))
+            .values(status=status, error=error, finished_at=_utcnow())
+        )
+        db.commit()
+        return result.rowcount > 0
+
+    def _execute(self, job_id: int, attempt: int) -> None:
+        db = SessionLocal()
+        try:
+            job = db.get(IngestionJob, job_id)
+            if job is None:
+                return
+            doc = db.get(KnowledgeDocument, job.document_id)
+            if doc is None:
+                self._finish(db, job_id, attempt, "failed", "Document no longer exists")
+                return
+            try:
+                self.rag_service.index_document(
+                    db, doc, heartbeat=lambda session: self._renew_lease(session, job_id, attempt)
+                )
+            except LeaseLost as e:
+                db.rollback()
+                print(f"⚠️ {e}; leaving it to the new owner")
+                return
+            except Exception as e:
+                db.rollback()
+                self._record_failure(db, job_id, attempt, e)
+                return
+            if self._finish(db, job_id, attempt, "done"):
+                print(f"✅ Ingested document {doc.id} ({doc.filename}): {doc.chunk_count} chunks")
+            else:
+                print(f"⚠️ Ingestion job {job_id} attempt {attempt} finished after losing its lease")
+        except Exception as e:
+            print(f"❌ Ingestion job {job_id} crashed: {e}")
+        finally:
+            db.close()
+
+    def _record_failure(self, db: Session, job_id: int, attempt: int, error: Exception) -> None:
+        job = db.execute(
+            select(IngestionJob).where(self._owned(job_id, attempt)).with_for_update()
+        ).scalar_one_or_none()
+        if job is None:
+            db.rollback()
+            return
+        job.error = str(error)[:2000]
+        if job.attempts < job.max_attempts:
+            delay = settings.INGESTION_RETRY_DELAY_SECONDS * (2 ** (job.attempts - 1))
+            job.status = "queued"
+            job.available_at = _utcnow() + timedelta(seconds=delay)
+            print(f"⚠️ Ingestion job {job_id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay:.0f}s: {error}")
+        else:
+            job.status = "failed"
+            job.finished_at = _utcnow()
+            print(f"❌ Ingestion job {job_id} failed after {job.attempts} attempts: {error}")
+        db.commit()
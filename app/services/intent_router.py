@@ -0,0 +1,124 @@
+"""
+Intent routing for chat turns.
+
+Labels:
+- casual:  whole message is small talk ("hi", "thanks!") -> no retrieval
+- faq:     FAQ lookup only (default, and for skip-KB terms like "bro")
+- kb:      FAQ + knowledge base (company / service triggers)
+- handoff: visitor asks for a person -> full retrieval so contact details are at hand
+
+The trigger sets are admin-editable (`intent_triggers` table, defaults below).
+They are compiled once per config version into two regexes (each trigger set as
+a prefix trie): an anchored one for casual messages, and one scanning
+alternation that finds every trigger label in a single left-to-right pass.
+Labels are ordered by priority, so when two triggers start at the same
+position the one that decides the route wins.
+"""
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import IntentTriggers
+
+CASUAL = "casual"
+FAQ = "faq"
+KB = "kb"
+HANDOFF = "handoff"
+
+DEFAULT_TRIGGERS: Dict[str, object] = {
+    "casual_phrases": [
+        "hi", "hello", "hey", "good morning", "good afternoon", "good evening", "greetings",
+        "how are you", "how's it going", "what's up",
+        "thanks", "thank you", "bye", "goodbye", "see you",
+        "yes", "no", "ok", "okay", "sure", "fine",
+    ],
+    "skip_kb_terms": ["critical analysis", "analyze me", "tell me about myself", "personal", "bro", "dude"],
+    "kb_terms": [
+        "dipietro", "audiology", "hearing", "appointment", "schedule", "clinic",
+        "office hours", "location", "address", "phone number", "contact info",
+        "services offered", "pricing", "cost", "insurance", "payment",
+        "hearing test", "hearing aid", "doctor", "audiologist",
+    ],
+    # Only route to the KB when the question is longer than kb_long_min_words
+    "kb_long_terms": ["appointment", "service", "clinic", "office", "schedule", "available"],
+    "kb_long_min_words": 8,
+    "handoff_terms": [
+        "talk to a human", "speak to a human", "real person", "live agent", "talk to someone",
+        "speak to someone", "representative", "call me back",
+    ],
+}
+
+
+def _trie_pattern(node: dict) -> str:
+    # "" marks the end of a term; longer continuations are tried before stopping there
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    if len(branches) == 1:
+        body = branches[0]
+        single_char = len(node) - ("" in node) == 1 and body == re.escape(next(c for c in node if c))
+    else:
+        body, single_char = "(?:" + "|".join(branches) + ")", False
+    if "" in node:
+        return body + "?" if single_char or len(branches) > 1 else "(?:" + body + ")?"
+    return body
+
+
+def _alternation(terms: List[str]) -> str:
+    """Terms compiled as a character trie, so shared prefixes ("hearing", "hearing aid",
+    "hearing test") are tried once instead of once per term, like an Aho-Corasick walk."""
+    trie: dict = {}
+    for term in {t.strip().lower() for t in terms if t and t.strip()}:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _trie_pattern(trie) or r"(?!)"
+
+
+class IntentRouter:
+    def __init__(self, triggers: Optional[dict] = None):
+        triggers = {**DEFAULT_TRIGGERS, **{k: v for k, v in (triggers or {}).items() if v is not None}}
+        self.kb_long_min_words = int(triggers["kb_long_min_words"])
+        self._casual = re.compile(rf"(?:{_alternation(triggers['casual_phrases'])})[!?.]*")
+        # Skip-KB and handoff terms are whole words; KB terms match inside words like the original `in` test.
+        self._scan = re.compile(
+            rf"(?P<{HANDOFF}>\b(?:{_alternation(triggers['handoff_terms'])})\b)"
+            rf"|(?P<skip_kb>\b(?:{_alternation(triggers['skip_kb_terms'])})\b)"
+            rf"|(?P<{KB}>{_alternation(triggers['kb_terms'])})"
+            rf"|(?P<kb_long>{_alternation(triggers['kb_long_terms'])})"
+        )
+
+    def route(self, query: str) -> str:
+        text = (query or "").lower().strip()
+        if self._casual.fullmatch(text):
+            return CASUAL
+        found = {match.lastgroup for match in self._scan.finditer(text)}
+        if HANDOFF in found:
+            return HANDOFF
+        if "skip_kb" in found:
+            return FAQ
+        if KB in found:
+            return KB
+        if "kb_long" in found and len(text.split()) > self.kb_long_min_words:
+            return KB
+        return FAQ
+
+
+def triggers_from_row(row: Optional[IntentTriggers]) -> dict:
+    if row is None:
+        return dict(DEFAULT_TRIGGERS)
+    return {
+        "casual_phrases": row.casual_phrases,
+        "skip_kb_terms": row.skip_kb_terms,
+        "kb_terms": row.kb_terms,
+        "kb_long_terms": row.kb_long_terms,
+        "kb_long_min_words": row.kb_long_min_words,
+        "handoff_terms": row.handoff_terms,
+    }
+
+
+def load_intent_router(db: Session) -> IntentRouter:
+    """Router compiled from the intent_triggers row (defaults until an admin saves one)."""
+    return IntentRouter(triggers_from_row(db.query(IntentTriggers).first()))
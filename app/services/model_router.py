@@ -0,0 +1,87 @@
+"""
+Model routing policy: which chat model and max_tokens a turn gets, by turn class.
+
+Turn classes (decided after retrieval):
+- casual:       small talk from the intent router ("hi", "thanks", "ok")
+- handoff:      visitor asks for a person (the reply points to contact details)
+- faq:          answer grounded only in FAQ entries
+- kb:           context includes knowledge-base passages
+- long_history: conversation history above MODEL_ROUTE_LONG_HISTORY_TOKENS
+- general:      anything else (no retrieved context)
+
+A route with no model uses the admin's MessagingConfig.ai_model, so only the
+trivial classes (casual, handoff) are moved to the small fast model by default;
+FAQ answers and everything else keep the admin's model unless an admin opts a
+class in through the `model_routes` table. The policy is recompiled with the
+config version. Hit counts are per worker process.
+"""
+import threading
+from collections import Counter
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import ModelRoute
+
+CASUAL = "casual"
+HANDOFF = "handoff"
+FAQ = "faq"
+KB = "kb"
+LONG_HISTORY = "long_history"
+GENERAL = "general"
+TURN_CLASSES = (CASUAL, HANDOFF, FAQ, KB, LONG_HISTORY, GENERAL)
+
+
+class Route(NamedTuple):
+    model: Optional[str]  # None = the configured ai_model
+    max_tokens: int
+
+
+DEFAULT_ROUTES: Dict[str, Route] = {
+    CASUAL: Route("gpt-4o-mini", 150),
+    HANDOFF: Route("gpt-4o-mini", 400),
+    FAQ: Route(None, 400),
+    KB: Route(None, 800),
+    LONG_HISTORY: Route(None, 800),
+    GENERAL: Route(None, 800),
+}
+
+
+def classify_turn(intent: str, used_faq_only: bool, used_kb: bool, history_tokens: int, long_history_tokens: int) -> str:
+    if intent == "casual":
+        return CASUAL
+    if intent == "handoff":
+        return HANDOFF
+    if history_tokens > long_history_tokens:
+        return LONG_HISTORY
+    if used_kb:
+        return KB
+    if used_faq_only:
+        return FAQ
+    return GENERAL
+
+
+def load_routes(db: Session) -> Dict[str, Route]:
+    """Defaults overlaid with the admin's model_routes rows."""
+    routes = dict(DEFAULT_ROUTES)
+    for row in db.query(ModelRoute).all():
+        if row.turn_class in routes:
+            routes[row.turn_class] = Route(row.model or None, row.max_tokens or DEFAULT_ROUTES[row.turn_class].max_tokens)
+    return routes
+
+
+class ModelRouter:
+    def __init__(self):
+        self.routes: Dict[str, Route] = dict(DEFAULT_ROUTES)
+        self._lock = threading.Lock()
+        self.hits: Counter = Counter()
+
+    def select(self, turn_class: str, default_model: str) -> Tuple[str, int]:
+        route = self.routes.get(turn_class) or self.routes[GENERAL]
+        with self._lock:
+            self.hits[turn_class] += 1
+        return route.model or default_model, route.max_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {turn_class: self.hits[turn_class] for turn_class in TURN_CLASSES}
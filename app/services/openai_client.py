@@ -0,0 +1,53 @@
+"""
+Process-wide AsyncOpenAI client with a tuned HTTP connection pool.
+Created on app startup and closed on shutdown; reused by every chat turn so
+requests ride on warm keep-alive connections instead of a fresh TLS handshake.
+"""
+from typing import Optional
+
+import httpx
+import openai
+
+from config import settings
+
+_client: Optional[openai.AsyncOpenAI] = None
+
+
+def _build_client() -> openai.AsyncOpenAI:
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.OPENAI_TIMEOUT_SECONDS,
+            connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS,
+        ),
+    )
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=http_client,
+    )
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """Return the shared client, creating it on first use (e.g. outside the app lifespan)."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def init_openai_client() -> openai.AsyncOpenAI:
+    """Build the shared client at startup."""
+    return get_openai_client()
+
+
+async def close_openai_client() -> None:
+    """Close the pooled connections on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -1,179 +1,275 @@
-import os
-import re
+import asyncio
+import threading
+import time
 import uuid
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 
-import chromadb
-from chromadb.config import Settings
-import openai
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from sqlalchemy.orm import Session
-import PyPDF2
-from docx import Document
+from sqlalchemy.ext.asyncio import AsyncSession
 try:
     import tiktoken  # optional; may require network on first use
 except Exception:  # pragma: no cover
     tiktoken = None
 
-from models import KnowledgeDocument, DocumentChunk, FAQ
+from models import KnowledgeDocument, DocumentChunk, FAQ, IngestionJob
 from config import settings
+from db import SessionLocal
+from services.openai_client import get_openai_client
+from services.faq_index import FAQIndex
+from services.hybrid_search import BM25Index, HybridHit, fuse, term_counts
+from services.intent_router import IntentRouter, load_intent_router, CASUAL, KB, HANDOFF
+from services.model_router import ModelRouter, classify_turn, load_routes
+from services.config_cache import config_cache, version_registry, CONFIG_VERSION, FAQ_VERSION, KB_VERSION
+from services.embeddings import load_embedding_backend
+from services.embedding_cache import QueryEmbeddingCache
+from services.response_cache import ResponseCache, CachedReply, normalize_query, make_tag
+from utils.text_extraction import iter_text_segments
+from utils import chunker
+from utils.token_counter import count_messages_tokens
+
+_HEAVY_RESOURCES = ("chroma_client", "collection", "faq_collection", "embedding_model", "tokenizer")
+
 
 class RAGService:
     def __init__(self):
-      
-        self.chroma_client = chromadb.PersistentClient(
+        # The embedding model, Chroma and the tokenizer take seconds to load, so they're
+        # created on first use (or by warm_up() in the background at startup) instead
+        # of here, which runs at import time before the server can bind.
+        self._resources: dict = {}
+        self._resource_locks = {name: threading.Lock() for name in _HEAVY_RESOURCES}
+        self.warmup_started_at: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+        # Trigram index over the FAQ table (built at warm-up, patched on FAQ writes)
+        self.faq_index = FAQIndex()
+        # BM25 over FAQ rows + document chunks (built at warm-up, patched on FAQ / document writes),
+        # fused with vector hits at query time
+        self.bm25_index = BM25Index()
+        # Stale search indexes are rebuilt here, one at a time, and swapped in when done;
+        # requests keep searching the previous index meanwhile
+        self.index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-index")
+        self._index_rebuild_lock = threading.Lock()
+        self._index_rebuild_pending = False
+        self.indexes_built = False
+        # Embedding and Chroma calls are CPU-bound/blocking; run them off the event loop.
+        # Background work (warm-up, FAQ embedding sync) gets its own pool so it can't hold up
+        # a chat turn's retrieval stages, and in-memory scoring never queues behind embeddings.
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_EXECUTOR_WORKERS,
+            thread_name_prefix="rag-embed",
+        )
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=settings.RETRIEVAL_EXECUTOR_WORKERS,
+            thread_name_prefix="rag-retrieve",
+        )
+        self.lexical_executor = ThreadPoolExecutor(
+            max_workers=settings.LEXICAL_EXECUTOR_WORKERS,
+            thread_name_prefix="rag-lexical",
+        )
+        # Query vectors by normalized text (starter questions are pre-warmed at startup)
+        self.query_embeddings = QueryEmbeddingCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+        # Generated replies for repeated first-turn questions (exact + semantic tiers)
+        self.response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+            min_similarity=settings.RESPONSE_CACHE_MIN_SIMILARITY,
+        )
+        # Compiled trigger sets (casual / faq / kb / handoff); replaced when the admin config changes
+        self.intent_router = IntentRouter()
+        # Turn class -> (model, max_tokens), with per-route hit counts
+        self.model_router = ModelRouter()
+    
+    def _resource(self, name: str, factory):
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+        with self._resource_locks[name]:
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
+
+    def _open_chroma(self):
+        import chromadb
+        from chromadb.config import Settings
+        return chromadb.PersistentClient(
             path="./chroma_db",
             settings=Settings(allow_reset=True)
         )
-        
-   
-        self.collection = self.chroma_client.get_or_create_collection(
+
+    def _load_embedding_model(self):
+        # sentence-transformers (torch) or fastembed (ONNX Runtime); same unit-length vectors either way
+        model = load_embedding_backend(settings.EMBEDDING_BACKEND, settings.EMBEDDING_THREADS)
+        print(f"✅ Embedding backend: {model.name}")
+        return model
+
+    @staticmethod
+    def _load_tokenizer():
+        # Optional tokenizer: fall back to word-count if unavailable or offline
+        if tiktoken is None:
+            return None
+        try:
+            # Prefer a generic encoding; may still try to fetch on first run
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+
+    @property
+    def chroma_client(self):
+        return self._resource("chroma_client", self._open_chroma)
+
+    @property
+    def collection(self):
+        return self._resource("collection", lambda: self.chroma_client.get_or_create_collection(
             name="knowledge_base",
             metadata={"hnsw:space": "cosine"}
-        )
-        
-        
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        # Optional tokenizer: fall back to word-count if unavailable or offline
-        self.tokenizer = None
-        if tiktoken is not None:
-            try:
-                # Prefer a generic encoding; may still try to fetch on first run
-                self.tokenizer = tiktoken.get_encoding("cl100k_base")
-            except Exception:
-                self.tokenizer = None
-        
-        
-        self.kb_triggers = [
-            "company", "business", "service", "product", "about us", "what do you do",
-            "services", "products", "pricing", "cost", "price", "contact", "location",
-            "address", "phone", "email", "team", "staff", "experience", "history",
-            "founded", "established", "mission", "vision", "values", "policy",
-            "procedure", "process", "how to", "documentation", "manual", "guide",
-            "faq", "frequently asked", "help", "support", "technical", "specification"
-        ]
-    
+        ))
+
+    @property
+    def faq_collection(self):
+        # FAQ question embeddings, for paraphrase matching next to the lexical FAQ index
+        return self._resource("faq_collection", lambda: self.chroma_client.get_or_create_collection(
+            name="faq_questions",
+            metadata={"hnsw:space": "cosine"}
+        ))
+
+    @property
+    def embedding_model(self):
+        return self._resource("embedding_model", self._load_embedding_model)
+
+    @property
+    def tokenizer(self):
+        return self._resource("tokenizer", self._load_tokenizer)
+
+    def warm_up(self) -> None:
+        """Load every heavy resource and run one embedding pass (blocking; call from a worker thread)."""
+        self.warmup_started_at = time.monotonic()
+        self.warmup_error = None
+        try:
+            for name in _HEAVY_RESOURCES:
+                getattr(self, name)
+            self.embedding_model.encode(["warm up"])
+        except Exception as e:
+            # Resources that failed are retried lazily by the next request that needs them
+            self.warmup_error = str(e)
+            print(f"❌ RAG warm-up failed: {e}")
+            return
+        self.warmup_seconds = round(time.monotonic() - self.warmup_started_at, 2)
+        print(f"✅ RAG resources ready in {self.warmup_seconds}s")
+
+    @property
+    def ready(self) -> bool:
+        return self.indexes_built and all(name in self._resources for name in _HEAVY_RESOURCES)
+
+    def warmup_status(self) -> dict:
+        if self.ready:
+            state = "ready"
+        elif self.warmup_error:
+            state = "failed"
+        elif self.warmup_started_at is not None:
+            state = "warming"
+        else:
+            state = "pending"
+        return {
+            "state": state,
+            "loaded": [name for name in _HEAVY_RESOURCES if name in self._resources]
+                      + (["search_indexes"] if self.indexes_built else []),
+            "seconds": self.warmup_seconds,
+            "error": self.warmup_error,
+        }
+
+    def refresh_indexes(self, db: Session) -> None:
+        """Request-path check: only compares versions, and schedules a rebuild when stale."""
+        if (not self.faq_index.is_current(db) or not self.bm25_index.is_current(db)
+                or self.bm25_index.needs_compaction):
+            self._schedule_index_rebuild()
+
+    def _schedule_index_rebuild(self) -> None:
+        with self._index_rebuild_lock:
+            if self._index_rebuild_pending:
+                return
+            self._index_rebuild_pending = True
+        self.index_executor.submit(self.build_search_indexes)
+
+    def build_search_indexes(self) -> None:
+        """Rebuild whichever search index is stale (blocking; warm-up and the index thread only)."""
+        with self._index_rebuild_lock:
+            # Cleared before reading versions, so a write landing mid-build schedules another pass
+            self._index_rebuild_pending = False
+        db = SessionLocal()
+        try:
+            started = time.monotonic()
+            if not self.faq_index.is_current(db):
+                self.faq_index.rebuild(db)
+                print(f"✅ FAQ index rebuilt in {time.monotonic() - started:.2f}s")
+            started = time.monotonic()
+            if not self.bm25_index.is_current(db) or self.bm25_index.needs_compaction:
+                self.bm25_index.rebuild(db)
+                print(f"✅ BM25 index rebuilt in {time.monotonic() - started:.2f}s")
+            self.indexes_built = True
+        except Exception as e:
+            print(f"⚠️ Search index rebuild failed: {e}")
+        finally:
+            db.close()
+
+    def apply_faq_changes(self, version: int, added: Iterable[Tuple[int, str, str]] = (), removed: Iterable[int] = ()) -> None:
+        """Patch the FAQ and BM25 indexes after a committed FAQ write that bumped the faq version."""
+        added, removed = list(added), list(removed)
+        self.faq_index.apply(version, added=added, removed=removed)
+        self.bm25_index.apply_faqs(version, added=added, removed=removed)
+
+    def refresh_intent_router(self, db: Session) -> IntentRouter:
+        """Current router for the admin-configured triggers (recompiled only when the config version moves)."""
+        self.intent_router = config_cache.get(db, "intent_router", load_intent_router)
+        return self.intent_router
+
+    def classify_intent(self, db: Session, query: str) -> str:
+        return self.refresh_intent_router(db).route(query)
+
+    def _route_turn(self, db: Session, query: str) -> str:
+        """Intent of the turn, with the model routing policy and search index versions refreshed alongside (one DB hop)."""
+        self.model_router.routes = config_cache.get(db, "model_routes", load_routes)
+        try:
+            self.refresh_indexes(db)
+        except Exception as e:
+            print(f"⚠️ Search index refresh failed: {e}")
+        return self.classify_intent(db, query)
+
     def should_use_knowledge_base(self, query: str) -> bool:
         """
         Determine if a query should use the knowledge base based on content analysis.
         Returns False for greetings and casual conversation.
         """
-        query_lower = query.lower().strip()
-        
-        # Always skip KB for casual/personal interactions
-        casual_patterns = [
-            r'^(hi|hello|hey|good morning|good afternoon|good evening|greetings)!?$',
-            r'^(how are you|how\'s it going|what\'s up)!?$',
-            r'^(thanks|thank you|bye|goodbye|see you)!?$',
-            r'^(yes|no|ok|okay|sure|fine)!?$',
-            r'.*\b(critical analysis|analyze me|tell me about myself|personal|bro|dude)\b.*'
-        ]
-        
-        for pattern in casual_patterns:
-            if re.match(pattern, query_lower):
-                return False
-        
-        # Look for specific company/business related triggers
-        company_triggers = [
-            "dipietro", "audiology", "hearing", "appointment", "schedule", "clinic",
-            "office hours", "location", "address", "phone number", "contact info",
-            "services offered", "pricing", "cost", "insurance", "payment",
-            "hearing test", "hearing aid", "doctor", "audiologist"
-        ]
-        
-        for trigger in company_triggers:
-            if trigger in query_lower:
-                return True
-                
-        # Only use KB for longer, specific business questions
-        if (len(query.split()) > 8 and 
-            any(word in query_lower for word in ["appointment", "service", "clinic", "office", "schedule", "available"])):
-            return True
-            
-        return False
+        return self.intent_router.route(query) in (KB, HANDOFF)
     
     def extract_text_from_file(self, file_path: str) -> str:
         """Extract text from various file formats."""
-        file_extension = Path(file_path).suffix.lower()
-        
-        if file_extension == '.pdf':
-            return self._extract_from_pdf(file_path)
-        elif file_extension == '.docx':
-            return self._extract_from_docx(file_path)
-        elif file_extension == '.txt':
-            return self._extract_from_txt(file_path)
-        else:
-            raise ValueError(f"Unsupported file format: {file_extension}")
+        return "\n".join(self.iter_text_segments(file_path))
     
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file."""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return text
-    
-    def _extract_from_docx(self, file_path: str) -> str:
-        """Extract text from Word document."""
-        doc = Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    
-    def _extract_from_txt(self, file_path: str) -> str:
-        """Extract text from text file."""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+    def iter_text_segments(self, file_path: str) -> Iterator[str]:
+        """Yield a document's text page by page / paragraph by paragraph."""
+        return iter_text_segments(file_path, pdf_workers=settings.PDF_EXTRACT_WORKERS)
     
     def chunk_text(self, text: str, max_tokens: int = 500) -> List[str]:
         """Split text into chunks based on token count."""
-        sentences = re.split(r'[.!?]+', text)
-        chunks = []
-        current_chunk = ""
-        
-        def token_len(s: str) -> int:
-            if self.tokenizer is not None:
-                try:
-                    return len(self.tokenizer.encode(s))
-                except Exception:
-                    pass
-            # Fallback: approximate tokens by words
-            return max(1, len(s.split()))
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-                
-            test_chunk = current_chunk + " " + sentence if current_chunk else sentence
-            if token_len(test_chunk) > max_tokens:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = sentence
-                else:
-                    
-                    words = sentence.split()
-                    step = max(1, max_tokens // 4)
-                    for i in range(0, len(words), step): 
-                        chunk_words = words[i:i + step]
-                        chunks.append(" ".join(chunk_words))
-            else:
-                current_chunk = test_chunk
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+        return chunker.chunk_text(text, max_tokens, settings.CHUNK_OVERLAP_TOKENS, self.tokenizer)
+    
+    def iter_chunks(self, segments: Iterable[str], max_tokens: int = 500) -> Iterator[str]:
+        """Chunk a stream of text segments (pages / paragraphs) as they are extracted."""
+        return chunker.iter_chunks(segments, max_tokens, settings.CHUNK_OVERLAP_TOKENS, self.tokenizer)
     
     def process_document(self, db: Session, file_path: str, filename: str) -> KnowledgeDocument:
         """Process a document and store it in the knowledge base."""
-       
-        text_content = self.extract_text_from_file(file_path)
-        
-   
+        doc = self.create_document(db, file_path, filename)
+        self.index_document(db, doc)
+        return doc
+    
+    def create_document(self, db: Session, file_path: str, filename: str) -> KnowledgeDocument:
+        """Register an uploaded file as an unprocessed knowledge base document."""
         doc = KnowledgeDocument(
             filename=filename,
             file_path=file_path,
@@ -184,116 +280,162 @@ class RAGService:
         db.add(doc)
         db.commit()
         db.refresh(doc)
+        return doc
+    
+    def index_document(self, db: Session, doc: KnowledgeDocument, heartbeat: Optional[Callable[[Session], None]] = None) -> KnowledgeDocument:
+        """Extract, chunk, embed and store a document's chunks.
+        Progress is committed after every batch (chunk_count grows, processed flips at the end),
+        and any chunks left by an earlier failed attempt are removed first so retries are safe.
+        `heartbeat(db)` runs inside every batch's transaction (the ingestion queue renews its lease
+        there, and raises to abort when the job was taken over).
+        """
+        self._clear_document_chunks(db, doc.id)
+        doc.processed = False
+        doc.chunk_count = 0
+        db.commit()
         
-       
-        chunks = self.chunk_text(text_content)
-        
-       
-        chunk_ids = []
-        for i, chunk_text in enumerate(chunks):
-           
-            embedding = self.embedding_model.encode(chunk_text).tolist()
+        # Extraction, chunking and embedding are streamed: only the current batch of
+        # chunks (plus one page / paragraph of text) is in memory at a time.
+        # Each batch gets one model forward pass, one Chroma add and one bulk insert.
+        chunks = self.iter_chunks(self.iter_text_segments(doc.file_path))
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        start = 0
+        # BM25 term counts per chunk (not the text), applied to the index once the document is committed
+        lexical_chunks = []
+        while batch := list(islice(chunks, batch_size)):
+            embeddings = self.embedding_model.encode(batch, batch_size=batch_size).tolist()
+            vector_ids = [f"{doc.id}_{start + i}_{uuid.uuid4().hex[:8]}" for i in range(len(batch))]
+            
+            # DB rows are committed before the vectors are added, so a failed commit can't leave
+            # vectors behind; rows whose add failed are cleared (with any vectors) on retry
+            db.bulk_save_objects([
+                DocumentChunk(
+                    document_id=doc.id,
+                    chunk_text=chunk_text,
+                    chunk_index=start + i,
+                    vector_id=vector_id
+                )
+                for i, (chunk_text, vector_id) in enumerate(zip(batch, vector_ids))
+            ])
+            doc.chunk_count = start + len(batch)
+            if heartbeat is not None:
+                heartbeat(db)
+            db.commit()
             
-        
-            vector_id = f"{doc.id}_{i}_{uuid.uuid4().hex[:8]}"
-           
             self.collection.add(
-                embeddings=[embedding],
-                documents=[chunk_text],
+                embeddings=embeddings,
+                documents=batch,
                 metadatas=[{
                     "document_id": doc.id,
-                    "filename": filename,
-                    "chunk_index": i
-                }],
-                ids=[vector_id]
+                    "filename": doc.filename,
+                    "chunk_index": start + i
+                } for i in range(len(batch))],
+                ids=vector_ids
             )
-            
-           
-            chunk = DocumentChunk(
-                document_id=doc.id,
-                chunk_text=chunk_text,
-                chunk_index=i,
-                vector_id=vector_id
+            lexical_chunks.extend(
+                (vector_id, start + i, term_counts(chunk_text))
+                for i, (chunk_text, vector_id) in enumerate(zip(batch, vector_ids))
             )
-            db.add(chunk)
-            chunk_ids.append(vector_id)
+            start += len(batch)
         
-       
         doc.processed = True
-        doc.chunk_count = len(chunks)
+        kb_version = version_registry.bump(db, KB_VERSION)
+        if heartbeat is not None:
+            heartbeat(db)
         db.commit()
+        self.bm25_index.apply_document(kb_version, doc.id, doc.filename, lexical_chunks)
         
         return doc
     
-    def search_faqs(self, db: Session, query: str) -> List[Tuple[str, float, dict]]:
-        """Search FAQs for relevant information using simple text matching."""
+    def _clear_document_chunks(self, db: Session, document_id: int) -> None:
+        """Remove a document's chunks from both the vector store and the DB (no commit)."""
+        chunks = db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).all()
+        # By metadata rather than by the DB's vector ids, so vectors without a row go too
+        self.collection.delete(where={"document_id": document_id})
+        for chunk in chunks:
+            db.delete(chunk)
+    
+    def search_faqs(self, query: str) -> List[Tuple[str, float, dict]]:
+        """Search FAQs for relevant information using the in-memory FAQ index."""
         # Always search FAQs regardless of query type - FAQs should be used for all questions
-        
-        query_lower = query.lower()
-        try:
-            faqs = db.query(FAQ).all()
-        except Exception as e:
+        return self.faq_index.search(query, limit=3)  # Return top 3 FAQ matches
+
+    def search_lexical(self, query: str) -> Tuple[List[Tuple[str, float, dict]], list]:
+        """FAQ index matches (used for direct answers) and BM25 hits over FAQs + document chunks.
+        CPU-bound and DB-free (index versions are checked by _route_turn): run it in lexical_executor."""
+        return self.search_faqs(query), self.bm25_index.search(query, settings.RETRIEVAL_CANDIDATES)
+
+    @staticmethod
+    def _faq_vector_id(faq_id: int) -> str:
+        return f"faq_{faq_id}"
+
+    def index_faq_embeddings(self, faqs: List[Tuple[int, str, str]]) -> None:
+        """Embed FAQ questions once (batched) and upsert them into the faq_questions collection."""
+        if not faqs:
+            return
+        questions = [question for _, question, _ in faqs]
+        embeddings = self.embedding_model.encode(questions, batch_size=64).tolist()
+        self.faq_collection.upsert(
+            ids=[self._faq_vector_id(faq_id) for faq_id, _, _ in faqs],
+            embeddings=embeddings,
+            documents=questions,
+            metadatas=[{"faq_id": faq_id} for faq_id, _, _ in faqs],
+        )
+
+    def remove_faq_embeddings(self, faq_ids: List[int]) -> None:
+        if faq_ids:
+            self.faq_collection.delete(ids=[self._faq_vector_id(faq_id) for faq_id in faq_ids])
+
+    def sync_faq_embeddings(self, db: Session) -> None:
+        """Embed FAQs that have no vector yet and drop vectors of deleted FAQs
+        (backfill for FAQs imported before semantic matching existed)."""
+        rows = db.query(FAQ.id, FAQ.question, FAQ.answer).order_by(FAQ.id).all()
+        existing = set(self.faq_collection.get(include=[])["ids"])
+        wanted = {self._faq_vector_id(faq_id) for faq_id, _, _ in rows}
+        missing = [tuple(r) for r in rows if self._faq_vector_id(r[0]) not in existing]
+        for start in range(0, len(missing), 256):
+            self.index_faq_embeddings(missing[start:start + 256])
+        stale = [vector_id for vector_id in existing if vector_id not in wanted]
+        if stale:
+            self.faq_collection.delete(ids=stale)
+
+    def search_faqs_semantic(self, query: str, top_k: int = 3, vector: Optional[np.ndarray] = None) -> List[Tuple[str, float, dict]]:
+        """Nearest FAQ questions by embedding (one ANN query). Only matches within
+        FAQ_SEMANTIC_MAX_DISTANCE that still exist in the FAQ index are returned.
+        Pass `vector` when the query is already embedded."""
+        if not settings.FAQ_SEMANTIC_ENABLED:
             return []
-        
+        count = self.faq_collection.count()
+        if count == 0:
+            return []
+        query_embedding = (vector if vector is not None else self._embed_query(query)).tolist()
+        results = self.faq_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=min(top_k, count),
+            include=["metadatas", "distances"]
+        )
         faq_results = []
-        for faq in faqs:
-            question_lower = faq.question.lower()
-            answer_lower = faq.answer.lower()
-            
-            # Calculate relevance score with better matching
-            score = 0
-            query_words = query_lower.split()
-            
-            # Exact question match gets highest score
-            if query_lower in question_lower:
-                score = 100  # Very high score for exact match
-            else:
-                # Check for word matches with better scoring
-                for word in query_words:
-                    if len(word) > 2:  # Only consider words longer than 2 characters
-                        if word in question_lower:
-                            score += 3  # Higher weight for question matches
-                        if word in answer_lower:
-                            score += 1  # Lower weight for answer matches
-                
-                # Check for partial matches
-                for word in query_words:
-                    if len(word) > 3:  # Only for longer words
-                        if any(word in q_word for q_word in question_lower.split()):
-                            score += 2
-                        if any(word in a_word for a_word in answer_lower.split()):
-                            score += 1
-            
-            # Normalize score (0-1 range)
-            if score > 0:
-                if score >= 100:  # Exact match
-                    distance = 0.0
-                else:
-                    normalized_score = min(1.0, score / max(1, len(query_words) * 3))
-                    distance = 1.0 - normalized_score
-                
-                faq_text = f"Q: {faq.question}\nA: {faq.answer}"
-                faq_results.append((
-                    faq_text, 
-                    distance, 
-                    {"source": "faq", "faq_id": faq.id, "question": faq.question}
-                ))
-        
-        # Sort by distance (lower is better) and return top results
-        faq_results.sort(key=lambda x: x[1])
-        return faq_results[:3]  # Return top 3 FAQ matches
+        for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+            entry = self.faq_index.get(metadata.get("faq_id"))
+            if entry is None or distance > settings.FAQ_SEMANTIC_MAX_DISTANCE:
+                continue
+            faq_results.append((
+                f"Q: {entry.question}\nA: {entry.answer}",
+                distance,
+                {"source": "faq", "faq_id": entry.faq_id, "question": entry.question, "match": "semantic"}
+            ))
+        return faq_results
 
     def search_knowledge_base(self, query: str, top_k: int = 3) -> List[Tuple[str, float, dict]]:
         """Search the knowledge base for relevant information."""
         if not self.should_use_knowledge_base(query):
             return []
-        
-        
-        query_embedding = self.embedding_model.encode(query).tolist()
-        
-    
+        return self.query_knowledge_base(self._embed_query(query), top_k)
+
+    def query_knowledge_base(self, vector: np.ndarray, top_k: int = 3) -> List[Tuple[str, float, dict]]:
+        """Nearest document chunks to an already embedded query."""
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=[vector.tolist()],
             n_results=top_k,
             include=["documents", "metadatas", "distances"]
         )
@@ -303,16 +445,140 @@ class RAGService:
         if results['documents'][0]:
             for i in range(len(results['documents'][0])):
                 doc_text = results['documents'][0][i]
-                metadata = results['metadatas'][0][i]
+                metadata = {**results['metadatas'][0][i], "vector_id": results['ids'][0][i]}
                 distance = results['distances'][0][i]
                 search_results.append((doc_text, distance, metadata))
         
         return search_results
     
-    def generate_rag_response(self, query: str, system_prompt: str, db: Session, history: list[dict] | None = None, messaging_config: dict | None = None) -> Tuple[str, bool]:
+    def _decisive_faq(self, query: str, lexical: List[Tuple[str, float, dict]], semantic: List[Tuple[str, float, dict]]):
+        """FAQ entry that answers the query on its own, else None.
+        Decisive means: the query is the FAQ question (modulo case/punctuation) or covers most of it,
+        or the embedded question is within FAQ_DIRECT_MAX_DISTANCE.
         """
-        Generate a response based on messaging configuration. Use KB when relevant; otherwise regular chat.
-        Returns (response, used_kb)
+        normalized = normalize_query(query)
+        entry = None
+        for _, distance, metadata in lexical:
+            if distance > 0.0:
+                break
+            candidate = self.faq_index.get(metadata.get("faq_id"))
+            question = normalize_query(candidate.question) if candidate else ""
+            if question and len(normalized) >= settings.FAQ_DIRECT_MIN_COVERAGE * len(question):
+                entry = candidate
+                break
+        if entry is None and semantic and semantic[0][1] <= settings.FAQ_DIRECT_MAX_DISTANCE:
+            entry = self.faq_index.get(semantic[0][2].get("faq_id"))
+        return entry
+
+    def _direct_faq_answer(self, entry) -> str:
+        """Stored answer of a decisive FAQ match, through the optional FAQ_DIRECT_ANSWER_TEMPLATE."""
+        try:
+            return settings.FAQ_DIRECT_ANSWER_TEMPLATE.format(answer=entry.answer, question=entry.question)
+        except (KeyError, IndexError, ValueError):
+            return entry.answer
+
+    def _with_hit_texts(self, hits: List[HybridHit]) -> List[HybridHit]:
+        """Fill in the text of lexical-only hits: FAQs from the FAQ index, chunks from the vector store."""
+        missing = [hit.metadata.get('vector_id') for hit in hits if not hit.text and hit.metadata.get('source') != 'faq']
+        chunk_texts = {}
+        if missing:
+            found = self.collection.get(ids=missing, include=["documents"])
+            chunk_texts = dict(zip(found["ids"], found["documents"]))
+        filled = []
+        for hit in hits:
+            text = hit.text
+            if not text and hit.metadata.get('source') == 'faq':
+                entry = self.faq_index.get(hit.metadata.get('faq_id'))
+                text = f"Q: {entry.question}\nA: {entry.answer}" if entry else ""
+            elif not text:
+                text = chunk_texts.get(hit.metadata.get('vector_id')) or ""
+            if text:
+                filled.append(hit._replace(text=text))
+        return filled
+
+    async def _await_stage(self, name: str, executor: ThreadPoolExecutor, fn: Callable, *args, default, inline_fallback: bool = False):
+        """Run `fn(*args)` on `executor`; `default` on timeout / error.
+        The RETRIEVAL_STAGE_TIMEOUT_SECONDS deadline counts from when a worker starts the job, so
+        waiting behind other turns doesn't empty the stage; that wait is bounded separately by
+        RETRIEVAL_QUEUE_TIMEOUT_SECONDS, after which an `inline_fallback` stage (cheap in-memory
+        scoring) runs on the event loop instead of being dropped.
+        """
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+
+        def run():
+            loop.call_soon_threadsafe(started.set)
+            return fn(*args)
+
+        future = loop.run_in_executor(executor, run)
+        try:
+            try:
+                await asyncio.wait_for(started.wait(), settings.RETRIEVAL_QUEUE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                future.cancel()
+                if not inline_fallback:
+                    print(f"⚠️ Retrieval stage '{name}' found no free worker, continuing without it")
+                    return default
+                print(f"⚠️ Retrieval stage '{name}' found no free worker, running it inline")
+                return fn(*args)
+            return await asyncio.wait_for(future, settings.RETRIEVAL_STAGE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Retrieval stage '{name}' missed its deadline, continuing without it")
+        except Exception as e:
+            print(f"⚠️ Retrieval stage '{name}' failed: {e}")
+        finally:
+            # Cancelled turn (e.g. KB search no longer needed): don't leave the job queued
+            future.cancel()
+        return default
+
+    async def _retrieve(self, q: str, intent: str) -> Tuple[list, list, list, list, Optional[object]]:
+        """
+        Retrieval stage for a turn, run concurrently instead of one lookup after another:
+        - lexical: FAQ index + BM25 (in-memory, scored in lexical_executor)
+        - embed the query, then the FAQ and KB vector searches side by side (retrieval_executor)
+        Every stage has a deadline. KB work is cancelled (or its result dropped) as soon
+        as an FAQ match is decisive.
+        Returns (lexical_faqs, bm25_hits, semantic_faqs, kb_hits, decisive_faq)
+        """
+        if intent == CASUAL:
+            return [], [], [], [], None
+        use_kb = intent in (KB, HANDOFF)
+        # Lexical scoring runs alongside the embedding rather than after it
+        lexical_task = asyncio.ensure_future(self._await_stage(
+            "lexical", self.lexical_executor, self.search_lexical, q, default=([], []), inline_fallback=True
+        ))
+        vector = await self._await_stage("embed", self.retrieval_executor, self._embed_query, q, default=None)
+
+        faq_task = kb_task = None
+        if vector is not None:
+            faq_task = asyncio.ensure_future(self._await_stage(
+                "faq_vector", self.retrieval_executor, self.search_faqs_semantic, q, settings.RETRIEVAL_CANDIDATES, vector, default=[]
+            ))
+            if use_kb:
+                kb_task = asyncio.ensure_future(self._await_stage(
+                    "kb_vector", self.retrieval_executor, self.query_knowledge_base, vector, settings.RETRIEVAL_CANDIDATES, default=[]
+                ))
+
+        lexical_faqs, bm25_hits = await lexical_task
+        semantic_faqs = await faq_task if faq_task is not None else []
+        decisive = self._decisive_faq(q, lexical_faqs, semantic_faqs)
+
+        kb_hits: list = []
+        if kb_task is not None:
+            if decisive is not None:
+                kb_task.cancel()
+            else:
+                kb_hits = await kb_task
+        if not use_kb or decisive is not None:
+            # Small talk, or the FAQ already answers it: FAQs only
+            bm25_hits = [hit for hit in bm25_hits if hit[1].get('source') == 'faq']
+        return lexical_faqs, bm25_hits, semantic_faqs, kb_hits, decisive
+
+    async def _build_completion_request(self, query: str, system_prompt: str, db: AsyncSession, history: list[dict] | None = None, messaging_config: dict | None = None) -> Tuple[Optional[dict], bool, Optional[str]]:
+        """
+        Run retrieval and assemble the chat.completions request for a turn.
+        Returns (completion_kwargs, used_kb, direct_reply); with strict FAQ mode on, a confident
+        FAQ match comes back as direct_reply (completion_kwargs None) and needs no LLM call.
         System prompt takes ABSOLUTE PRIORITY over all other instructions.
         """
         # Default messaging config if not provided
@@ -342,63 +608,62 @@ class RAGService:
 
         q = contextualize_query(query, history)
 
-        # Always search FAQs first - they should be the primary source for all questions
-        faq_results = self.search_faqs(db, q)
-        
-        # If we have good FAQ results, use them
-        if faq_results and faq_results[0][1] < 0.5:  # Good FAQ match (distance < 0.5)
-            all_results = faq_results
-        else:
-            # If no good FAQ matches, check if we should use knowledge base
-            if self.should_use_knowledge_base(q):
-                kb_results = self.search_knowledge_base(q)
-                all_results = faq_results + kb_results
-                all_results.sort(key=lambda x: x[1])  # Sort by distance (lower is better)
-            else:
-                # No good FAQ matches and KB not needed, use regular chat
-                all_results = []
-        
-        if not all_results:
-            # SYSTEM PROMPT IS ABSOLUTE - use it exactly as provided without modification
-            # Only add minimal context about no KB results if needed
-            messages: list[dict] = [{"role": "system", "content": system_prompt}]
-            if history:
-                messages.extend(history)
-            messages.append({"role": "user", "content": q})
+        # casual turns skip retrieval, faq ones skip the KB
+        intent = await db.run_sync(self._route_turn, q)
+
+        # Lexical (FAQ index + BM25) and vector candidates, fused by rank below
+        lexical_faqs, bm25_hits, semantic_faqs, kb_hits, decisive = await self._retrieve(q, intent)
 
-            client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model=messaging_config.get('ai_model', settings.OPENAI_MODEL),
-                temperature=0.3,  # Lower temperature for more consistent adherence to instructions
-                max_tokens=800,  # Generous limit - let system prompt control length
-                messages=messages,
+        # Follow-ups rewritten by contextualize_query aren't standalone questions
+        if settings.FAQ_DIRECT_ANSWER_ENABLED and messaging_config.get('strict_faq') and q == query and decisive is not None:
+            direct_reply = self._direct_faq_answer(decisive)
+            if direct_reply:
+                return None, True, direct_reply
+
+        # FAQ and chunk embeddings come from the same model, so their cosine distances compare
+        vector_hits = sorted(semantic_faqs + kb_hits, key=lambda x: x[1])
+
+        # Top hits by reciprocal rank fusion, each with a calibrated [0, 1] relevance score
+        hits = fuse(bm25_hits, vector_hits, limit=settings.RETRIEVAL_TOP_K, min_score=settings.RETRIEVAL_MIN_SCORE)
+        if any(not hit.text for hit in hits):
+            hits = await self._await_stage(
+                "hit_text", self.retrieval_executor, self._with_hit_texts, hits,
+                default=[hit for hit in hits if hit.text],
             )
-            return response.choices[0].message.content, False
 
         # Build KB context
         context_parts: list[str] = []
-        for doc_text, score, metadata in all_results:
-            if score < 0.7:
-                if metadata.get('source') == 'faq':
-                    context_parts.append(f"FAQ: {doc_text}")
-                else:
-                    context_parts.append(f"From {metadata.get('filename', 'document')}: {doc_text}")
+        for doc_text, score, metadata in hits:
+            if metadata.get('source') == 'faq':
+                context_parts.append(f"FAQ: {doc_text}")
+            else:
+                context_parts.append(f"From {metadata.get('filename', 'document')}: {doc_text}")
+
+        # Model and output budget by turn class (small fast model for small talk / handoffs by default)
+        used_kb_passages = any(metadata.get('source') != 'faq' for _, _, metadata in hits)
+        # A bare "thanks" / "ok" is rewritten into a follow-up for retrieval, but is still small talk
+        turn_class = classify_turn(
+            CASUAL if self.intent_router.route(query) == CASUAL else intent,
+            used_faq_only=bool(hits) and not used_kb_passages,
+            used_kb=used_kb_passages,
+            history_tokens=count_messages_tokens(history) if history else 0,
+            long_history_tokens=settings.MODEL_ROUTE_LONG_HISTORY_TOKENS,
+        )
+        model, max_tokens = self.model_router.select(turn_class, messaging_config.get('ai_model', settings.OPENAI_MODEL))
+        completion = {
+            'model': model,
+            'temperature': 0.3,  # Lower temperature for more consistent adherence to instructions
+            'max_tokens': max_tokens,  # Generous by default - let system prompt control length
+        }
 
         if not context_parts:
-            # SYSTEM PROMPT IS ABSOLUTE - use it exactly as provided
+            # SYSTEM PROMPT IS ABSOLUTE - use it exactly as provided without modification
             messages: list[dict] = [{"role": "system", "content": system_prompt}]
             if history:
                 messages.extend(history)
             messages.append({"role": "user", "content": q})
-
-            client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model=messaging_config.get('ai_model', settings.OPENAI_MODEL),
-                temperature=0.3,  # Lower temperature for more consistent adherence to instructions
-                max_tokens=800,  # Generous limit - let system prompt control length
-                messages=messages,
-            )
-            return response.choices[0].message.content, False
+            completion['messages'] = messages
+            return completion, False, None
 
         context = "\n\n".join(context_parts)
         
@@ -419,35 +684,123 @@ class RAGService:
         if history:
             messages.extend(history)
         messages.append({"role": "user", "content": q})
+        completion['messages'] = messages
+        return completion, True, None
 
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model=messaging_config.get('ai_model', settings.OPENAI_MODEL),
-            temperature=0.3,  # Lower temperature for strict adherence to system prompt
-            max_tokens=800,  # Generous limit - let system prompt control the length
-            messages=messages,
-        )
-        return response.choices[0].message.content, True
+    def _embed_query(self, text: str) -> np.ndarray:
+        """Unit-length float32 embedding of a query, from the LRU when it was asked before."""
+        key = normalize_query(text)
+        vector = self.query_embeddings.get(key)
+        if vector is None:
+            vector = self.embedding_model.encode([key])[0]
+            self.query_embeddings.put(key, vector)
+        return vector
+
+    def warm_query_embeddings(self, queries: Iterable[str]) -> int:
+        """Embed queries (e.g. starter questions) ahead of time in one batch; returns how many were new."""
+        keys = list(dict.fromkeys(
+            key for key in (normalize_query(q) for q in queries) if key and key not in self.query_embeddings
+        ))
+        if keys:
+            vectors = self.embedding_model.encode(keys, batch_size=settings.EMBEDDING_BATCH_SIZE)
+            for key, vector in zip(keys, vectors):
+                self.query_embeddings.put(key, vector)
+        return len(keys)
+
+    def _content_versions(self, db: Session) -> Tuple[int, int, int]:
+        return (version_registry.current(db, FAQ_VERSION), version_registry.current(db, KB_VERSION),
+                version_registry.current(db, CONFIG_VERSION))
+
+    async def _lookup_response_cache(self, query: str, system_prompt: str, db: AsyncSession, history: list[dict] | None, messaging_config: dict | None) -> Tuple[Optional[tuple], Optional[CachedReply]]:
+        """Check the response cache for this turn.
+        Returns (cache_slot, cached_reply): cached_reply on a hit; otherwise cache_slot is what
+        to store the generated reply under (None when the turn isn't cacheable, e.g. mid-conversation).
+        """
+        if not settings.RESPONSE_CACHE_ENABLED or len(history or []) > settings.RESPONSE_CACHE_MAX_HISTORY:
+            return None, None
+        normalized = normalize_query(query)
+        if not normalized:
+            return None, None
+        faq_version, kb_version, config_version = await db.run_sync(self._content_versions)
+        tag = make_tag(system_prompt, messaging_config or {}, faq_version, kb_version, config_version)
+        cached = self.response_cache.get_exact(tag, normalized)
+        if cached is not None:
+            return None, cached
+        vector = None
+        if settings.RESPONSE_CACHE_SEMANTIC_ENABLED:
+            # A slow embedding is treated as a semantic-tier miss
+            vector = await self._await_stage("cache_embed", self.retrieval_executor, self._embed_query, normalized, default=None)
+        cached = self.response_cache.get_similar(tag, vector)
+        if cached is not None:
+            return None, cached
+        return (tag, normalized, vector), None
+
+    async def generate_rag_response(self, query: str, system_prompt: str, db: AsyncSession, history: list[dict] | None = None, messaging_config: dict | None = None) -> Tuple[str, bool]:
+        """
+        Generate a response based on messaging configuration. Use KB when relevant; otherwise regular chat.
+        Repeated questions are answered from the response cache, and confident FAQ matches
+        (strict FAQ mode) with the stored answer, without calling OpenAI.
+        Returns (response, used_kb)
+        """
+        cache_slot, cached = await self._lookup_response_cache(query, system_prompt, db, history, messaging_config)
+        if cached is not None:
+            return cached.reply, cached.used_kb
+        completion, used_kb, direct_reply = await self._build_completion_request(query, system_prompt, db, history, messaging_config)
+        if direct_reply is not None:
+            return direct_reply, used_kb
+        client = get_openai_client()
+        response = await client.chat.completions.create(**completion)
+        reply = response.choices[0].message.content
+        if cache_slot is not None and reply:
+            self.response_cache.put(*cache_slot, CachedReply(reply, used_kb))
+        return reply, used_kb
+
+    async def stream_rag_response(self, query: str, system_prompt: str, db: AsyncSession, history: list[dict] | None = None, messaging_config: dict | None = None) -> Tuple[AsyncIterator[str], bool]:
+        """
+        Streaming variant of generate_rag_response.
+        Retrieval runs up front; returns (delta_iterator, used_kb) where the iterator
+        yields content deltas as OpenAI produces them (a cached or direct FAQ reply comes as one delta).
+        """
+        async def single_delta(reply: str) -> AsyncIterator[str]:
+            yield reply
+
+        cache_slot, cached = await self._lookup_response_cache(query, system_prompt, db, history, messaging_config)
+        if cached is not None:
+            return single_delta(cached.reply), cached.used_kb
+
+        completion, used_kb, direct_reply = await self._build_completion_request(query, system_prompt, db, history, messaging_config)
+        if direct_reply is not None:
+            return single_delta(direct_reply), used_kb
+        client = get_openai_client()
+        stream = await client.chat.completions.create(stream=True, **completion)
+
+        async def deltas() -> AsyncIterator[str]:
+            parts: list[str] = []
+            async for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            # Only a fully received reply is cached
+            if cache_slot is not None and parts:
+                self.response_cache.put(*cache_slot, CachedReply("".join(parts), used_kb))
+
+        return deltas(), used_kb
     
     def delete_document(self, db: Session, document_id: int) -> bool:
         """Delete a document and its chunks from both DB and vector store."""
+        self._clear_document_chunks(db, document_id)
         
-        chunks = db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).all()
-        
-    
-        vector_ids = [chunk.vector_id for chunk in chunks]
-        if vector_ids:
-            self.collection.delete(ids=vector_ids)
-        
-     
-        for chunk in chunks:
-            db.delete(chunk)
-        
-       
         doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.id == document_id).first()
         if doc:
+            # Drop any pending ingestion work for it (FK cascade isn't enforced everywhere, e.g. sqlite)
+            db.query(IngestionJob).filter(IngestionJob.document_id == document_id).delete(synchronize_session=False)
             db.delete(doc)
+            kb_version = version_registry.bump(db, KB_VERSION)
             db.commit()
+            self.bm25_index.apply_document(kb_version, document_id)
             return True
         
         return False
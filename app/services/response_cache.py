@@ -0,0 +1,142 @@
+"""
+Cache of generated chat replies for repeated visitor questions.
+
+Entries are keyed on the normalized question plus a tag made of everything else
+that shapes the answer: system prompt, model / messaging settings and the `faq`
+and `kb` version counters. Any FAQ, document or prompt change therefore moves
+the tag and the old entries stop matching (they're dropped on the next write).
+
+Two tiers:
+- exact: same normalized question, a dict lookup
+- semantic: cosine similarity of the question embedding against the cached
+  questions (unit vectors, one matrix product), above a threshold
+
+Entries expire after a TTL and the whole cache is LRU-bounded.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+
+
+class CachedReply(NamedTuple):
+    reply: str
+    used_kb: bool
+
+
+class _Entry(NamedTuple):
+    reply: CachedReply
+    vector: Optional[np.ndarray]
+    expires_at: float
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace ("Office hours?" == "office  hours")."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", (query or "").lower())).strip()
+
+
+def make_tag(system_prompt: str, messaging_config: dict, faq_version: int, kb_version: int, config_version: int) -> str:
+    # The config version covers what else shapes a reply: model routes, intent triggers, prompts
+    parts = [
+        system_prompt,
+        str(messaging_config.get("ai_model")),
+        str(messaging_config.get("response_length")),
+        str(messaging_config.get("strict_faq")),
+        str(messaging_config.get("conversational")),
+        f"faq:{faq_version}",
+        f"kb:{kb_version}",
+        f"config:{config_version}",
+    ]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, min_similarity: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._tag: Optional[str] = None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Stacked question vectors for the semantic tier, rebuilt lazily after writes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[str] = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get_exact(self, tag: str, normalized: str) -> Optional[CachedReply]:
+        with self._lock:
+            if tag != self._tag:
+                return None
+            entry = self._entries.get(normalized)
+            if entry is None or entry.expires_at < time.monotonic():
+                return None
+            self._entries.move_to_end(normalized)
+            self.exact_hits += 1
+            return entry.reply
+
+    def get_similar(self, tag: str, vector: Optional[np.ndarray]) -> Optional[CachedReply]:
+        """Best cached reply whose question is at least `min_similarity` (cosine) to `vector`."""
+        with self._lock:
+            if vector is None or tag != self._tag or not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_keys = [key for key, entry in self._entries.items() if entry.vector is not None]
+                self._matrix = (
+                    np.vstack([self._entries[key].vector for key in self._matrix_keys])
+                    if self._matrix_keys else np.empty((0, vector.shape[0]), dtype=np.float32)
+                )
+            if not self._matrix_keys:
+                self.misses += 1
+                return None
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            entry = self._entries.get(self._matrix_keys[best])
+            if scores[best] < self.min_similarity or entry is None or entry.expires_at < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(self._matrix_keys[best])
+            self.semantic_hits += 1
+            return entry.reply
+
+    def put(self, tag: str, normalized: str, vector: Optional[np.ndarray], reply: CachedReply) -> None:
+        if self.max_entries <= 0 or not reply.reply:
+            return
+        with self._lock:
+            if tag != self._tag:
+                # Prompt / FAQ / KB / model changed: everything cached so far is stale
+                self._entries.clear()
+                self._tag = tag
+            self._entries[normalized] = _Entry(reply, vector, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(normalized)
+            now = time.monotonic()
+            while self._entries:
+                oldest_key, oldest = next(iter(self._entries.items()))
+                if len(self._entries) > self.max_entries or oldest.expires_at < now:
+                    del self._entries[oldest_key]
+                else:
+                    break
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._tag = None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,146 @@
+"""
+Token-aware sentence chunker for knowledge base ingestion.
+
+Sentences are split without dropping their punctuation and without breaking on
+common abbreviations / initials. Each sentence is tokenized exactly once and
+chunks are packed from running token counts, so chunking is linear in the
+length of the text. Consecutive chunks can share up to `overlap_tokens` of
+trailing sentences, and a sentence longer than a whole chunk is cut into token
+windows.
+"""
+import re
+from collections import deque
+from typing import Iterable, Iterator, List
+
+# Longest unterminated run of text carried between streamed segments before it's
+# flushed as a sentence of its own
+MAX_SENTENCE_CARRY_CHARS = 20000
+
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc", "inc", "ltd",
+    "co", "corp", "no", "nos", "fig", "figs", "approx", "dept", "est", "vol", "ch",
+    "sec", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct",
+    "nov", "dec", "mon", "tue", "wed", "thu", "fri", "sat", "sun", "ave", "blvd",
+    "rd", "ph", "md", "dds", "ed", "al", "cf", "ext", "tel",
+}
+
+# Sentence-ending punctuation (plus closing quotes / brackets) followed by whitespace
+_SENTENCE_END = re.compile(r'[.!?]+[)"\'\]”’]*(?=\s)')
+_NEXT_CHAR = re.compile(r'\s+(\S)')
+
+
+class _WordEncoding:
+    """Stand-in for a tiktoken encoding when none is available: one token per word."""
+
+    def encode(self, text: str) -> List[str]:
+        return text.split()
+
+    def decode(self, tokens: List[str]) -> str:
+        return " ".join(tokens)
+
+
+def _word_before(text: str, end: int) -> str:
+    start = end
+    while start > 0 and not text[start - 1].isspace() and text[start - 1] not in ".!?":
+        start -= 1
+    return text[start:end]
+
+
+def _sentence_ends(text: str) -> Iterator[int]:
+    """Offsets just past each sentence end whose following text is known."""
+    for match in _SENTENCE_END.finditer(text):
+        following = _NEXT_CHAR.match(text, match.end())
+        if following is None:
+            # Only whitespace after it so far: the next character decides
+            return
+        if match.group().rstrip(')"\']”’') == ".":
+            word = _word_before(text, match.start()).lstrip("([\"'“‘").lower()
+            if word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                continue
+            if following.group(1).islower():
+                continue
+        yield match.end()
+
+
+def iter_sentences(segments: Iterable[str]) -> Iterator[str]:
+    """Split a stream of text segments (pages, paragraphs, ...) into sentences,
+    carrying the unfinished tail of each segment into the next one.
+    """
+    buffer = ""
+    for segment in segments:
+        buffer = buffer + "\n" + segment if buffer else segment
+        start = 0
+        for end in _sentence_ends(buffer):
+            yield buffer[start:end].strip()
+            start = end
+        buffer = buffer[start:]
+        if len(buffer) > MAX_SENTENCE_CARRY_CHARS:
+            # Unpunctuated text: don't let the carry (and re-scanning it) grow without bound
+            yield buffer.strip()
+            buffer = ""
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in iter_sentences([text]) if s]
+
+
+def chunk_sentences(sentences: Iterable[str], max_tokens: int = 500, overlap_tokens: int = 0, encoding=None) -> Iterator[str]:
+    """Pack sentences into chunks of at most `max_tokens` tokens.
+    Each chunk after the first starts with the trailing sentences of the previous one,
+    up to `overlap_tokens` tokens (capped at half a chunk).
+    """
+    encoding = encoding or _WordEncoding()
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    window: deque[tuple[str, int]] = deque()
+    window_tokens = 0
+    fresh = 0  # sentences in the window not yet emitted in any chunk
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        # Counted as it appears inside a chunk (after a joining space)
+        n = len(encoding.encode(" " + sentence))
+
+        if n > max_tokens:
+            if fresh:
+                yield " ".join(s for s, _ in window)
+            window.clear()
+            window_tokens = 0
+            fresh = 0
+            tokens = encoding.encode(sentence)
+            step = max(1, max_tokens - overlap_tokens)
+            for i in range(0, len(tokens), step):
+                piece = encoding.decode(tokens[i:i + max_tokens]).strip()
+                if piece:
+                    yield piece
+                if i + max_tokens >= len(tokens):
+                    break
+            continue
+
+        if window_tokens + n > max_tokens:
+            if fresh:
+                yield " ".join(s for s, _ in window)
+                fresh = 0
+            while window and (window_tokens > overlap_tokens or window_tokens + n > max_tokens):
+                _, dropped = window.popleft()
+                window_tokens -= dropped
+
+        window.append((sentence, n))
+        window_tokens += n
+        fresh += 1
+
+    if fresh:
+        yield " ".join(s for s, _ in window)
+
+
+def chunk_text(text: str, max_tokens: int = 500, overlap_tokens: int = 0, encoding=None) -> List[str]:
+    return list(chunk_sentences(iter_sentences([text]), max_tokens, overlap_tokens, encoding))
+
+
+def iter_chunks(segments: Iterable[str], max_tokens: int = 500, overlap_tokens: int = 0, encoding=None) -> Iterator[str]:
+    return chunk_sentences(iter_sentences(segments), max_tokens, overlap_tokens, encoding)
@@ -0,0 +1,88 @@
+"""
+Streaming text extraction for knowledge base documents.
+
+Each extractor yields the document a piece at a time (PDF pages, DOCX
+paragraphs, TXT line blocks) so ingestion can chunk and embed as it reads
+instead of holding the whole text in memory. Kept free of heavy imports so PDF
+page workers in a process pool start quickly.
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import PyPDF2
+from docx import Document
+
+TXT_BLOCK_CHARS = 64 * 1024
+
+# Per-process reader reused across pages of the same file (process pool workers)
+_worker_pdf: tuple[str, PyPDF2.PdfReader] | None = None
+
+
+def iter_text_segments(file_path: str, pdf_workers: int = 0) -> Iterator[str]:
+    """Yield the text of a document piece by piece (pages / paragraphs / blocks)."""
+    file_extension = Path(file_path).suffix.lower()
+
+    if file_extension == '.pdf':
+        return iter_pdf_pages(file_path, workers=pdf_workers)
+    elif file_extension == '.docx':
+        return iter_docx_paragraphs(file_path)
+    elif file_extension == '.txt':
+        return iter_txt_blocks(file_path)
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+
+def iter_pdf_pages(file_path: str, workers: int = 0) -> Iterator[str]:
+    """Yield page texts in order. With workers > 1, pages are extracted in a process
+    pool with a bounded read-ahead, so at most ~2 pages per worker are held at once.
+    """
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        if workers <= 1 or page_count <= 1:
+            for page in pdf_reader.pages:
+                yield page.extract_text() or ""
+            return
+
+    # "spawn" so the pool doesn't fork a process full of model / DB threads
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, page_count), mp_context=ctx) as pool:
+        pending = deque()
+        next_page = 0
+        while next_page < page_count or pending:
+            while next_page < page_count and len(pending) < workers * 2:
+                pending.append(pool.submit(_extract_pdf_page, file_path, next_page))
+                next_page += 1
+            yield pending.popleft().result() or ""
+
+
+def _extract_pdf_page(file_path: str, page_index: int) -> str:
+    global _worker_pdf
+    if _worker_pdf is None or _worker_pdf[0] != file_path:
+        _worker_pdf = (file_path, PyPDF2.PdfReader(file_path))
+    return _worker_pdf[1].pages[page_index].extract_text()
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    doc = Document(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text
+
+
+def iter_txt_blocks(file_path: str, block_chars: int = TXT_BLOCK_CHARS) -> Iterator[str]:
+    """Yield whole lines grouped into blocks of roughly `block_chars` characters."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        block: list[str] = []
+        size = 0
+        for line in file:
+            block.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield "".join(block)
+                block = []
+                size = 0
+        if block:
+            yield "".join(block)
@@ -1,22 +1,35 @@
 """
 Token counting utilities with fallback for when tiktoken is unavailable
 """
+from functools import lru_cache
+
 try:
     import tiktoken
 except ImportError:
     tiktoken = None
 
-def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
-    """
-    Count tokens in text. Falls back to word-based estimation if tiktoken unavailable.
-    """
-    if tiktoken is not None:
+# Distinct message texts whose token counts are remembered; chat history is
+# re-counted every turn, so each message is only tokenized once while it's hot
+TOKEN_COUNT_CACHE_SIZE = 8192
+
+def _encoding_family(model: str) -> str:
+    return "gpt-4" if model.startswith("gpt-4") else "gpt-3.5-turbo"
+
+@lru_cache(maxsize=None)
+def get_encoding(family: str):
+    """tiktoken encoding for a model family, loaded once per process (None if unavailable)."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(family)
+    except Exception:
+        return None
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def _count_tokens_cached(text: str, family: str) -> int:
+    encoding = get_encoding(family)
+    if encoding is not None:
         try:
-            # Use the appropriate encoding for the model
-            if model.startswith("gpt-4"):
-                encoding = tiktoken.encoding_for_model("gpt-4")
-            else:
-                encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
             return len(encoding.encode(text))
         except Exception:
             pass
@@ -25,6 +38,17 @@ def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
     word_count = len(text.split())
     return max(1, int(word_count / 0.75))
 
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Count tokens in text. Falls back to word-based estimation if tiktoken unavailable.
+    Counts are memoized per (text, encoding), so repeated history messages cost a lookup.
+    """
+    return _count_tokens_cached(text or "", _encoding_family(model))
+
+def token_cache_stats() -> dict:
+    info = _count_tokens_cached.cache_info()
+    return {"entries": info.currsize, "hits": info.hits, "misses": info.misses}
+
 def count_messages_tokens(messages: list[dict], model: str = "gpt-3.5-turbo") -> int:
     """
     Count tokens for a list of OpenAI messages.
@@ -0,0 +1,142 @@
+"""
+FAQ index check: legacy full-table FAQ scan vs services.faq_index.FAQIndex
+Randomized equivalence test (including incremental add/remove patches and a
+rebuild swap), plus per-query timings.
+Run from the app directory: python verify_faq_index.py [--faqs 500 5000] [--queries 2000]
+"""
+import argparse
+import random
+import sys
+import time
+
+from services.faq_index import FAQIndex
+
+
+def legacy_search_faqs(faqs: list[tuple[int, str, str]], query: str) -> list[tuple[str, float, dict]]:
+    """The previous RAGService.search_faqs scan, kept here for comparison (rows in table order)."""
+    query_lower = query.lower()
+    faq_results = []
+    for faq_id, question, answer in faqs:
+        question_lower = question.lower()
+        answer_lower = answer.lower()
+        score = 0
+        query_words = query_lower.split()
+        if query_lower in question_lower:
+            score = 100
+        else:
+            for word in query_words:
+                if len(word) > 2:
+                    if word in question_lower:
+                        score += 3
+                    if word in answer_lower:
+                        score += 1
+            for word in query_words:
+                if len(word) > 3:
+                    if any(word in q_word for q_word in question_lower.split()):
+                        score += 2
+                    if any(word in a_word for a_word in answer_lower.split()):
+                        score += 1
+        if score > 0:
+            if score >= 100:
+                distance = 0.0
+            else:
+                normalized_score = min(1.0, score / max(1, len(query_words) * 3))
+                distance = 1.0 - normalized_score
+            faq_results.append((
+                f"Q: {question}\nA: {answer}",
+                distance,
+                {"source": "faq", "faq_id": faq_id, "question": question}
+            ))
+    faq_results.sort(key=lambda x: x[1])
+    return faq_results[:3]
+
+
+WORDS = ("hearing aid aids audiology clinic appointment appointments patient insurance tinnitus "
+         "device battery batteries warranty fitting exam follow-up results referral schedule "
+         "cost price pricing hours open office test testing doctor audiologist new old "
+         "the a an is do we you can how what when my").split()
+
+
+def random_text(rng: random.Random, low: int, high: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    if rng.random() < 0.3:
+        words = [w.capitalize() if rng.random() < 0.5 else w.upper() for w in words]
+    text = " ".join(words)
+    return text + rng.choice(["?", "?", ".", "", "!"])
+
+
+def random_query(rng: random.Random, faqs: list[tuple[int, str, str]]) -> str:
+    kind = rng.random()
+    if kind < 0.2 and faqs:
+        # A slice of a stored question (exact-match path, may cut words)
+        question = rng.choice(faqs)[1]
+        start = rng.randint(0, max(0, len(question) - 1))
+        return question[start:start + rng.randint(0, 25)]
+    if kind < 0.3:
+        # Word fragments and very short words (substring and < 3 char paths)
+        return " ".join(rng.choice(WORDS)[:rng.randint(1, 6)] for _ in range(rng.randint(1, 4)))
+    return random_text(rng, 1, 8)
+
+
+def check(faqs: list[tuple[int, str, str]], index: FAQIndex, rng: random.Random, queries: int) -> tuple[int, float, float]:
+    mismatches = 0
+    legacy_s = index_s = 0.0
+    for _ in range(queries):
+        query = random_query(rng, faqs)
+        start = time.perf_counter()
+        expected = legacy_search_faqs(faqs, query)
+        legacy_s += time.perf_counter() - start
+        start = time.perf_counter()
+        actual = index.search(query, limit=3)
+        index_s += time.perf_counter() - start
+        if actual != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ mismatch for {query!r}:\n   legacy {expected}\n   index  {actual}")
+    return mismatches, legacy_s, index_s
+
+
+def report(n: int, phase: str, faqs: list[tuple[int, str, str]], index: FAQIndex, rng: random.Random, queries: int) -> int:
+    mismatches, legacy_s, index_s = check(faqs, index, rng, queries)
+    print(f"{n:>6} {phase:>8} {queries:>8} {legacy_s * 1000 / queries:>10.3f} "
+          f"{index_s * 1000 / queries:>9.3f} {mismatches:>9}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--faqs", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failed = 0
+    print(f"{'faqs':>6} {'phase':>8} {'queries':>8} {'legacy ms':>10} {'index ms':>9} {'mismatch':>9}")
+    for n in args.faqs:
+        faqs = [(faq_id, random_text(rng, 2, 12), random_text(rng, 5, 40)) for faq_id in range(1, n + 1)]
+        index = FAQIndex()
+        index.rebuild_from_rows(faqs, 1)
+        failed += report(n, "rebuild", faqs, index, rng, args.queries)
+
+        # Incremental patches, as the FAQ upload / delete endpoints apply them
+        removed = set(rng.sample([faq_id for faq_id, _, _ in faqs], k=max(1, n // 10)))
+        added = [(n + 1 + i, random_text(rng, 2, 12), random_text(rng, 5, 40)) for i in range(max(1, n // 10))]
+        index.apply(2, removed=removed)
+        index.apply(3, added=added)
+        assert index.version == 3, "incremental patches were not applied"
+        patched = [row for row in faqs if row[0] not in removed] + added
+        failed += report(n, "patched", patched, index, rng, args.queries)
+
+        # A rebuild from an older version must not replace the patched index
+        index.rebuild_from_rows(faqs, 2)
+        assert index.version == 3, "stale rebuild replaced a newer index"
+
+    if failed:
+        print(f"❌ {failed} mismatching queries")
+        sys.exit(1)
+    print("✅ FAQ index matches the legacy scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -2280,11 +2280,26 @@ function FilesSection(){
       const res = await fetch(`${API_BASE}/documents/upload`, { method:'POST', body: fd, headers: ADMIN_KEY ? { 'X-Api-Key': ADMIN_KEY } : undefined });
       const data = await res.json().catch(()=>({}));
       if(!res.ok){ setStatus(`Error: ${data.detail || res.statusText}`); }
-      else { setStatus(`Uploaded: ${data.filename} (${data.chunk_count} chunks)`); setFile(null); await fetchDocs(); }
+      else { setStatus(`Uploaded: ${data.filename} — processing…`); setFile(null); await fetchDocs(); if(data.job_id) watchJob(data.job_id, data.filename); }
     }catch(e:any){ setStatus(`Error: ${e?.message||'Upload failed'}`); }
     finally{ setBusy(false); }
   }
 
+  // Ingestion runs in the background; poll the job until it finishes
+  async function watchJob(jobId:number, filename:string){
+    for(;;){
+      await new Promise(r=>setTimeout(r, 2000));
+      try{
+        const r = await fetch(`${API_BASE}/documents/jobs/${jobId}`, { cache:'no-store', headers: ADMIN_KEY ? { 'X-Api-Key': ADMIN_KEY } : undefined });
+        if(!r.ok) return;
+        const job = await r.json();
+        if(job.status === 'done'){ setStatus(`Trained: ${filename} (${job.chunk_count} chunks)`); await fetchDocs(); return; }
+        if(job.status === 'failed'){ setStatus(`Error processing ${filename}: ${job.error || 'failed'}`); await fetchDocs(); return; }
+        setStatus(`Processing ${filename}… ${job.chunk_count} chunks${job.attempts > 1 ? ` (attempt ${job.attempts})` : ''}`);
+      }catch(_){ return; }
+    }
+  }
+
   async function del(id:number){
     if(!confirm('Delete this document?')) return;
     try{
@@ -281,12 +281,60 @@
         const t=el('div','cb-msg-text',content);
         m.appendChild(av); m.appendChild(t);
         messages.appendChild(m);
+        messages.scrollTop=messages.scrollHeight;
+        return t;
       } else {
         const m=el('div','cb-message '+role,content);
         messages.appendChild(m);
       }
       messages.scrollTop=messages.scrollHeight;
     }
+    // Streaming chat over SSE (POST chat/stream). Calls onDelta(text, meta) per token chunk and
+    // resolves with the final {reply, used_faq, run_id}. Throws 'stream-unavailable' before any
+    // output if the backend or browser can't stream, so callers can fall back to the blocking endpoint.
+    async function streamChat(message, signal, onDelta){
+      const o={method:'POST',mode:'cors',signal:signal,headers:{'Content-Type':'application/json','Accept':'text/event-stream','X-Client-Id':getClientId()},body:JSON.stringify({message:message,client_id:getClientId()})};
+      let url=joinUrl(cfg.apiBase,'chat/stream');
+      let res=await fetch(url,o);
+      if(res.status===404 && !/\/api\//.test(url)){ url=url.replace(/(https?:\/\/[^/]+)(\/.*)?/, (m,origin,rest)=> origin + '/api' + (rest||'')); res=await fetch(url,o); }
+      if(!res.ok || !res.body || typeof res.body.getReader!=='function' || typeof TextDecoder==='undefined') throw new Error('stream-unavailable');
+      const reader=res.body.getReader(); const decoder=new TextDecoder();
+      let buf=''; let meta={used_faq:false}; let final=null;
+      while(true){
+        const chunk=await reader.read(); if(chunk.done) break;
+        buf+=decoder.decode(chunk.value,{stream:true});
+        let idx;
+        while((idx=buf.indexOf('\n\n'))>=0){
+          const frame=buf.slice(0,idx); buf=buf.slice(idx+2);
+          let ev='message'; let data='';
+          frame.split('\n').forEach(line=>{ if(line.startsWith('event:')) ev=line.slice(6).trim(); else if(line.startsWith('data:')) data+=line.slice(5).trim(); });
+          if(!data) continue;
+          const payload=JSON.parse(data);
+          if(ev==='meta') meta=payload;
+          else if(ev==='delta') onDelta(payload.delta||'', meta);
+          else if(ev==='done') final=payload;
+          else if(ev==='error') throw new Error(payload.reply||'Stream error');
+        }
+      }
+      return final || {reply:'', used_faq:!!meta.used_faq, run_id:null};
+    }
+    // Ask the bot and render the reply as it streams in (typing indicator until the first token)
+    async function askBot(text, signal){
+      let bubble=null; let streamed='';
+      try{
+        const data=await streamChat(text, signal, (delta, meta)=>{
+          if(!bubble){ stopTyping(); bubble=addMessage('assistant',''); streamed=(meta&&meta.used_faq)?'📚 ':''; }
+          streamed+=delta; bubble.textContent=streamed; messages.scrollTop=messages.scrollHeight;
+        });
+        const finalText=(data.used_faq?'📚 ':'')+(data.reply||'');
+        if(bubble){ bubble.textContent=finalText; }
+        else { stopTyping(); addMessage('assistant',finalText); }
+      }catch(e){
+        if(!(e && e.message==='stream-unavailable')) throw e;
+        const data=await api('chat',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({message:text,client_id:getClientId()}), signal: signal});
+        stopTyping(); addMessage('assistant',(data.used_faq?'📚 ':'')+data.reply);
+      }
+    }
     async function loadMessages(){ 
       console.log('Loading messages...');
       const clientId = getClientId();
@@ -327,8 +375,7 @@
       const text=input.value.trim(); if(!text) return;
       addMessage('user',text); input.value=''; setSendingMode(true); inflightCtrl=new AbortController(); startTyping();
       try{
-        const data=await api('chat',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({message:text,client_id:getClientId()}), signal: inflightCtrl.signal});
-        stopTyping(); addMessage('assistant',(data.used_faq?'📚 ':'')+data.reply);
+        await askBot(text, inflightCtrl.signal);
       }catch(e){ 
         stopTyping(); 
         if(e && (e.name==='AbortError' || /aborted/i.test(String(e)))){ 
@@ -830,15 +877,7 @@
     inflightCtrl = new AbortController();
     startTyping();
     
-    api('chat', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message: question, client_id: getClientId() }),
-      signal: inflightCtrl.signal
-    }).then(data => {
-      stopTyping();
-      addMessage('assistant', (data.used_faq ? '📚 ' : '') + data.reply);
-    }).catch(e => {
+    askBot(question, inflightCtrl.signal).catch(e => {
       stopTyping();
       const errorMsg = (window.messagingConfig && window.messagingConfig.server_error_message)
         ? window.messagingConfig.server_error_message
@@ -849,32 +888,36 @@
     });
   }
   // Form functions removed
-  async function refreshConfig(){ 
+  // Load widget/messaging config + starter questions. Uses the single ETag-cached bootstrap
+  // endpoint; falls back to the three legacy endpoints on older backends.
+  async function loadConfigs(revalidate){
+    try{
+      const boot=await api('widget-bootstrap', revalidate?{cache:'no-cache'}:undefined);
+      if(boot && boot.widget_config) return [boot.widget_config, boot.messaging_config||null, boot.starter_questions||null];
+    }catch(e){ console.warn('Bootstrap config unavailable, falling back:', e); }
+    return Promise.all([
+      api('widget-config').catch(e => { console.warn('Failed to load widget config:', e); return null; }),
+      api('messaging-config').catch(e => { console.warn('Failed to load messaging config:', e); return null; }),
+      api('starter-questions').catch(e => { console.warn('Failed to load starter questions:', e); return null; })
+    ]);
+  }
+  // revalidate=true skips the browser's max-age window (conditional request, 304 if unchanged)
+  async function refreshConfig(revalidate){ 
     try{ 
-      const wc=await api('widget-config'); 
+      const [wc, messagingConfig, starterQuestions] = await loadConfigs(revalidate===true);
       if(!wc) return;
       
       // Set global widget config
       window.widgetConfig = wc;
       console.log('Widget config loaded:', wc);
       
-      // Load messaging configuration
-      let messagingConfig = null;
-      try {
-        messagingConfig = await api('messaging-config');
+      if(messagingConfig) {
         window.messagingConfig = messagingConfig;
-      } catch (e) {
-        console.warn('Failed to load messaging config:', e);
       }
       
-      // Load starter questions configuration
-      let starterQuestions = null;
-      try {
-        starterQuestions = await api('starter-questions');
+      if(starterQuestions) {
         window.starterQuestions = starterQuestions;
         console.log('Loaded starter questions:', starterQuestions);
-      } catch (e) {
-        console.warn('Failed to load starter questions:', e);
       } 
       
       // Update primary color
@@ -1007,7 +1050,7 @@
     } 
   }
   (async()=>{ await refreshConfig(); })();
-    let poll=null; function startPoll(){ if(poll) return; poll=setInterval(refreshConfig,30000);} function stopPoll(){ if(poll){ clearInterval(poll); poll=null; }}
+    let poll=null; function startPoll(){ if(poll) return; poll=setInterval(()=>{ refreshConfig(true).catch(()=>{}); },30000);} function stopPoll(){ if(poll){ clearInterval(poll); poll=null; }}
     btn.onclick=async()=>{ 
       const was=panel.classList.contains('open'); 
       if(!was){ 
@@ -1054,7 +1097,7 @@
       }
     });
     close.onclick=()=>{ panel.classList.remove('open'); stopPoll(); };
-  try{ window.addEventListener('storage', e=>{ if(e && e.key==='widget_config_version'){ refreshConfig(); }}); }catch(_){ }
+  try{ window.addEventListener('storage', e=>{ if(e && e.key==='widget_config_version'){ refreshConfig(true); }}); }catch(_){ }
   send.onclick=()=>{ if(isSending){ abortRequest(); } else { sendMessage(); } };
   input.addEventListener('keydown',e=>{ if(e.key==='Enter' && !isSending) sendMessage(); if(e.key==='Escape' && isSending) abortRequest(); });
     // Form functions removed
@@ -60,11 +60,39 @@ echo ""
 echo "Parallel Total Time: ${PARALLEL_TIME}ms"
 echo ""
 
+echo "Testing Combined Bootstrap (Single Request)..."
+echo "-----------------------------------------------"
+
+START=$(date +%s%3N)
+ETAG=$(curl -s -D - -o /dev/null "$API_BASE/widget-bootstrap" | tr -d '\r' | awk -F': ' 'tolower($1)=="etag"{print $2}')
+echo "✓ widget-bootstrap fetched (ETag: ${ETAG:-none})"
+END=$(date +%s%3N)
+
+BOOTSTRAP_TIME=$((END - START))
+echo ""
+echo "Bootstrap Total Time: ${BOOTSTRAP_TIME}ms"
+echo ""
+
+echo "Testing Bootstrap Revalidation (If-None-Match)..."
+echo "-------------------------------------------------"
+
+START=$(date +%s%3N)
+STATUS=$(curl -s -o /dev/null -w "%{http_code}" -H "If-None-Match: $ETAG" "$API_BASE/widget-bootstrap")
+echo "✓ widget-bootstrap revalidated (HTTP $STATUS)"
+END=$(date +%s%3N)
+
+REVALIDATE_TIME=$((END - START))
+echo ""
+echo "Revalidation Total Time: ${REVALIDATE_TIME}ms"
+echo ""
+
 echo "================================="
 echo "Results Summary"
 echo "================================="
-echo "Sequential: ${SEQUENTIAL_TIME}ms"
-echo "Parallel:   ${PARALLEL_TIME}ms"
+echo "Sequential:   ${SEQUENTIAL_TIME}ms"
+echo "Parallel:     ${PARALLEL_TIME}ms"
+echo "Bootstrap:    ${BOOTSTRAP_TIME}ms"
+echo "Revalidation: ${REVALIDATE_TIME}ms (HTTP $STATUS)"
 
 if [ $PARALLEL_TIME -lt $SEQUENTIAL_TIME ]; then
     IMPROVEMENT=$((SEQUENTIAL_TIME * 100 / PARALLEL_TIME))